@@ -6,6 +6,7 @@ from dataclasses import replace
 from datetime import datetime, timezone
 from datetime import timedelta
 
+import orjson
 import requests
 from dotenv import load_dotenv
 
@@ -39,7 +40,7 @@ from src.digest.interactive import (
     build_digest_topics_keyboard,
     parse_digest_callback,
 )
-from src.ingest.listener import ingest_update
+from src.ingest.listener import ingest_update, ingest_updates
 from src.rollups.refresh import maybe_refresh_rollups_before_digest
 from src.telegram_client import TelegramClient
 from src.util.logging import configure_logging
@@ -49,6 +50,9 @@ from src.util.time import DailyTime, next_run_utc, now_utc, to_iso_utc
 
 log = logging.getLogger(__name__)
 
+# Encoded once; getUpdates is called in a tight long-poll loop.
+_POLL_ALLOWED_UPDATES = orjson.dumps(["message", "edited_message", "callback_query"]).decode("utf-8")
+
 
 def main() -> None:
     load_dotenv()
@@ -99,7 +103,7 @@ def main() -> None:
                 updates = client.get_updates(
                     offset=offset,
                     timeout_seconds=config.poll_timeout_seconds,
-                    allowed_updates=["message", "edited_message", "callback_query"],
+                    allowed_updates=_POLL_ALLOWED_UPDATES,
                 )
                 db.set_state("last_poll_ok_at_utc", poll_now_iso)
                 if prior_backoff > 1.0:
@@ -122,11 +126,10 @@ def main() -> None:
                 backoff_seconds = min(backoff_seconds * 2, 60.0)
                 updates = []
 
-            for update in updates:
-                try:
-                    ingest_update(db=db, config=config, update=update)
-                except Exception:
-                    log.exception("Failed to ingest update_id=%s", update.get("update_id"))
+            failed_ingest = _ingest_updates_batch(db=db, config=config, updates=updates)
+
+            for idx, update in enumerate(updates):
+                if idx in failed_ingest:
                     continue
 
                 offset = int(update["update_id"]) + 1
@@ -256,6 +259,31 @@ def main() -> None:
         db.close()
 
 
+def _ingest_updates_batch(*, db: Database, config: Config, updates: list[dict]) -> set[int]:
+    """
+    Ingest a poll's updates in one transaction; returns indexes of updates that failed.
+
+    If the batch write fails, updates are retried one by one so a single bad update
+    does not block the rest of the poll.
+    """
+    if not updates:
+        return set()
+    try:
+        ingest_updates(db=db, config=config, updates=updates)
+        return set()
+    except Exception:
+        log.exception("Batch ingest of %s updates failed; retrying individually", len(updates))
+
+    failed: set[int] = set()
+    for idx, update in enumerate(updates):
+        try:
+            ingest_update(db=db, config=config, update=update)
+        except Exception:
+            log.exception("Failed to ingest update_id=%s", update.get("update_id"))
+            failed.add(idx)
+    return failed
+
+
 def _format_duration(duration: timedelta) -> str:
     seconds = int(duration.total_seconds())
     if seconds <= 0:
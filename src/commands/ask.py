@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 from datetime import timedelta
+from itertools import islice
 import re
+from typing import Iterator
 
 from src.config import Config
 from src.db import Database
@@ -13,35 +15,38 @@ from src.util.time import now_utc, parse_duration, to_iso_utc
 
 _TOKEN_RE = re.compile(r"[A-Za-z0-9_]{3,}")
 _URL_RE = re.compile(r"https?://\S+")
-_STOPWORDS = {
-    "a",
-    "an",
-    "and",
-    "are",
-    "did",
-    "do",
-    "does",
-    "for",
-    "how",
-    "in",
-    "is",
-    "it",
-    "not",
-    "of",
-    "on",
-    "or",
-    "the",
-    "this",
-    "to",
-    "was",
-    "we",
-    "were",
-    "what",
-    "when",
-    "where",
-    "why",
-    "with",
-}
+_WHITESPACE_RE = re.compile(r"\s+")
+_STOPWORDS = frozenset(
+    {
+        "a",
+        "an",
+        "and",
+        "are",
+        "did",
+        "do",
+        "does",
+        "for",
+        "how",
+        "in",
+        "is",
+        "it",
+        "not",
+        "of",
+        "on",
+        "or",
+        "the",
+        "this",
+        "to",
+        "was",
+        "we",
+        "were",
+        "what",
+        "when",
+        "where",
+        "why",
+        "with",
+    }
+)
 
 _BROAD_PATTERNS = [
     "what's going on",
@@ -98,16 +103,10 @@ _PR_REF_RE = re.compile(r"\bpr\s*#?\s*\d+\b|\bpull request\b", flags=re.IGNORECA
 
 
 def _extract_query_tokens(question: str) -> list[str]:
-    tokens = [t.lower() for t in _TOKEN_RE.findall(question)]
-    tokens = [t for t in tokens if t not in _STOPWORDS]
-
-    unique: list[str] = []
-    for token in tokens:
-        if token not in unique:
-            unique.append(token)
-        if len(unique) >= 12:
-            break
-    return unique
+    lowered = (t.lower() for t in _TOKEN_RE.findall(question))
+    # dict.fromkeys dedupes in first-seen order without the quadratic list membership scan.
+    unique = dict.fromkeys(t for t in lowered if t not in _STOPWORDS)
+    return list(islice(unique, 12))
 
 
 def _build_fts_query(question: str) -> str:
@@ -126,7 +125,7 @@ def _is_broad_question(question: str, *, tokens: list[str]) -> bool:
 
 
 def _one_line(text: str) -> str:
-    return re.sub(r"\s+", " ", text).strip()
+    return _WHITESPACE_RE.sub(" ", text).strip()
 
 
 def _is_log_like(text: str) -> bool:
@@ -269,6 +268,28 @@ def _parse_ask_args(args: str) -> tuple[timedelta | None, bool, str] | None:
     return None, False, raw
 
 
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _scan_citation_ids(tail: str) -> Iterator[int]:
+    """
+    Yield N for each standalone "E<N>" token (1-3 digits, case-insensitive) in one pass.
+    """
+    n = len(tail)
+    i = 0
+    while i < n:
+        if tail[i] in "Ee" and (i == 0 or not _is_word_char(tail[i - 1])):
+            j = i + 1
+            while j < n and j - i <= 3 and tail[j].isdecimal():
+                j += 1
+            if j > i + 1 and (j == n or not _is_word_char(tail[j])):
+                yield int(tail[i + 1 : j])
+                i = j
+                continue
+        i += 1
+
+
 def _extract_citations(text: str, *, max_evidence: int) -> list[int]:
     """
     Extract citation ids from a line like: "Citations: E1, E3".
@@ -277,10 +298,8 @@ def _extract_citations(text: str, *, max_evidence: int) -> list[int]:
     for line in reversed(text.splitlines()):
         if line.strip().lower().startswith("citations:"):
             tail = line.split(":", 1)[1]
-            ids = re.findall(r"\bE(\d{1,3})\b", tail, flags=re.IGNORECASE)
             out: list[int] = []
-            for raw in ids:
-                idx = int(raw)
+            for idx in _scan_citation_ids(tail):
                 if 1 <= idx <= max_evidence and idx not in out:
                     out.append(idx)
             return out
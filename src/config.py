@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from functools import cached_property
 import os
 from typing import Iterable
 
@@ -12,9 +13,9 @@ def _parse_int(value: str, *, name: str) -> int:
         raise ValueError(f"Invalid integer for {name}: {value!r}") from exc
 
 
-def _parse_csv_ints(value: str) -> set[int]:
+def _parse_csv_ints(value: str) -> frozenset[int]:
     items = [part.strip() for part in value.split(",")]
-    return {int(item) for item in items if item}
+    return frozenset(int(item) for item in items if item)
 
 
 def _parse_float(value: str, *, name: str) -> float:
@@ -44,7 +45,7 @@ def _first_non_empty(values: Iterable[str | None]) -> str | None:
 class Config:
     telegram_bot_token: str
     source_chat_id: int
-    control_chat_ids: set[int]
+    control_chat_ids: frozenset[int]
     source_chat_username: str | None = None
 
     db_path: str = "./data/kaspa.db"
@@ -79,6 +80,14 @@ class Config:
     rollup_auto_refresh_before_digest: bool = False
     rollup_refresh_max_topics: int = 6
     rollup_refresh_min_interval_seconds: int = 600
+    rollup_refresh_concurrency: int = 4
+
+    @cached_property
+    def allowed_chat_ids(self) -> frozenset[int]:
+        """
+        Chats the listener stores messages from: the source chat plus the control chats.
+        """
+        return frozenset({self.source_chat_id, *self.control_chat_ids})
 
     @staticmethod
     def from_env() -> "Config":
@@ -141,6 +150,7 @@ class Config:
         rollup_refresh_min_interval_seconds = int(
             os.getenv("ROLLUP_REFRESH_MIN_INTERVAL_SECONDS", "600")
         )
+        rollup_refresh_concurrency = int(os.getenv("ROLLUP_REFRESH_CONCURRENCY", "4"))
 
         control_digest_thread_id_raw = _first_non_empty([os.getenv("CONTROL_DIGEST_THREAD_ID")])
         control_digest_thread_id = (
@@ -178,4 +188,5 @@ class Config:
             rollup_auto_refresh_before_digest=rollup_auto_refresh_before_digest,
             rollup_refresh_max_topics=rollup_refresh_max_topics,
             rollup_refresh_min_interval_seconds=rollup_refresh_min_interval_seconds,
+            rollup_refresh_concurrency=rollup_refresh_concurrency,
         )
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
 import json
 import logging
 import os
 import sqlite3
-from typing import Any, Iterable
+from typing import Any, Iterable, Iterator
+
+import orjson
 
 
 log = logging.getLogger(__name__)
@@ -14,6 +17,141 @@ log = logging.getLogger(__name__)
 
 SCHEMA_VERSION = "1"
 
+# Kept as module-level strings so every call hits sqlite3's statement cache.
+_UPSERT_MESSAGE_SQL = """
+INSERT INTO messages (
+    chat_id,
+    message_id,
+    thread_id,
+    date_utc,
+    from_id,
+    from_username,
+    from_display,
+    text,
+    raw_json,
+    reply_to_message_id,
+    is_service,
+    edit_date_utc,
+    ingested_at_utc
+) VALUES (
+    :chat_id,
+    :message_id,
+    :thread_id,
+    :date_utc,
+    :from_id,
+    :from_username,
+    :from_display,
+    :text,
+    :raw_json,
+    :reply_to_message_id,
+    :is_service,
+    :edit_date_utc,
+    :ingested_at_utc
+)
+ON CONFLICT(chat_id, message_id) DO UPDATE SET
+    thread_id = COALESCE(excluded.thread_id, messages.thread_id),
+    date_utc = excluded.date_utc,
+    from_id = COALESCE(excluded.from_id, messages.from_id),
+    from_username = COALESCE(excluded.from_username, messages.from_username),
+    from_display = COALESCE(excluded.from_display, messages.from_display),
+    text = COALESCE(excluded.text, messages.text),
+    raw_json = excluded.raw_json,
+    reply_to_message_id = COALESCE(excluded.reply_to_message_id, messages.reply_to_message_id),
+    is_service = excluded.is_service,
+    edit_date_utc = COALESCE(excluded.edit_date_utc, messages.edit_date_utc),
+    ingested_at_utc = excluded.ingested_at_utc;
+"""
+
+_SET_STATE_SQL = """
+INSERT INTO state(key, value) VALUES (?, ?)
+ON CONFLICT(key) DO UPDATE SET value = excluded.value;
+"""
+
+_UPSERT_TOPIC_SQL = """
+INSERT INTO topics(chat_id, thread_id, title, created_at_utc, updated_at_utc)
+VALUES (:chat_id, :thread_id, :title, :now_utc_iso, :now_utc_iso)
+ON CONFLICT(chat_id, thread_id) DO UPDATE SET
+    title = COALESCE(excluded.title, topics.title),
+    updated_at_utc = excluded.updated_at_utc;
+"""
+
+# Forum-topic fields from stored raw_json payloads (Bot API updates or bare message objects),
+# newest first. SQLite picks the message object and pulls all fields with one multi-path
+# json_extract, so the caller only decodes a small array instead of the whole payload.
+# The CASE checks json_valid first so a malformed payload is skipped rather than raising.
+_BACKFILL_TOPIC_TITLES_SQL = """
+WITH recent AS (
+    SELECT m.thread_id, m.raw_json, m.date_utc
+    FROM messages m
+    WHERE
+        m.chat_id = :chat_id
+        AND (m.raw_json LIKE '%forum_topic_created%' OR m.raw_json LIKE '%forum_topic_edited%')
+        AND (:thread_ids IS NULL OR m.thread_id IN (SELECT value FROM json_each(:thread_ids)))
+    ORDER BY m.date_utc DESC
+    LIMIT :limit
+),
+payloads AS (
+    SELECT
+        thread_id,
+        raw_json,
+        date_utc,
+        CASE
+            WHEN typeof(raw_json) != 'text' OR NOT json_valid(raw_json) THEN NULL
+            WHEN json_type(raw_json, '$.message') = 'object' THEN '$.message'
+            WHEN json_type(raw_json, '$.edited_message') = 'object' THEN '$.edited_message'
+            WHEN json_type(raw_json, '$.message') IS NULL AND json_type(raw_json, '$.edited_message') IS NULL
+                THEN '$'
+        END AS base
+    FROM recent
+)
+SELECT
+    thread_id AS fallback_thread_id,
+    json_extract(
+        raw_json,
+        base || '.message_thread_id',
+        base || '.forum_topic_created.name',
+        base || '.forum_topic_edited.name',
+        base || '.reply_to_message.message_thread_id',
+        base || '.reply_to_message.message_id',
+        base || '.reply_to_message.forum_topic_created.name',
+        base || '.reply_to_message.forum_topic_edited.name'
+    ) AS fields
+FROM payloads
+WHERE base IS NOT NULL
+ORDER BY date_utc DESC;
+"""
+
+# Porter stemming over unicode61 so "merged" finds "merging"; remove_diacritics 2 also folds
+# diacritics on codepoints that carry several of them.
+_FTS_TOKENIZE = "porter unicode61 remove_diacritics 2"
+
+# Triggers that keep the external-content messages_fts index in sync with messages.
+_FTS_TRIGGERS_SQL = {
+    "messages_ai": """
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, text) VALUES (new.id, coalesce(new.text, ''));
+END;
+""",
+    "messages_ad": """
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, text)
+    VALUES ('delete', old.id, coalesce(old.text, ''));
+END;
+""",
+    "messages_au": """
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, text)
+    VALUES ('delete', old.id, coalesce(old.text, ''));
+    INSERT INTO messages_fts(rowid, text) VALUES (new.id, coalesce(new.text, ''));
+END;
+""",
+}
+
+
+def _clean_topic_name(name: Any) -> str | None:
+    stripped = name.strip() if isinstance(name, str) else ""
+    return stripped or None
+
 
 def _ensure_parent_dir(path: str) -> None:
     parent = os.path.dirname(os.path.abspath(path))
@@ -44,15 +182,29 @@ class TopicRollup:
 
 
 class Database:
-    def __init__(self, db_path: str) -> None:
+    def __init__(self, db_path: str, *, fast_bulk: bool = False) -> None:
+        """
+        fast_bulk trades crash safety for insert speed (in-memory journal, no fsync). Only use
+        it for throwaway databases such as tests.
+        """
         _ensure_parent_dir(db_path)
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256)
         self.conn.row_factory = sqlite3.Row
 
-        self.conn.execute("PRAGMA journal_mode=WAL;")
-        self.conn.execute("PRAGMA synchronous=NORMAL;")
+        if fast_bulk:
+            self.conn.execute("PRAGMA journal_mode=MEMORY;")
+            self.conn.execute("PRAGMA synchronous=OFF;")
+            self.conn.execute("PRAGMA cache_size=-65536;")
+        else:
+            self.conn.execute("PRAGMA journal_mode=WAL;")
+            self.conn.execute("PRAGMA synchronous=NORMAL;")
+            # ~20 MB page cache; an upper bound, not a preallocation.
+            self.conn.execute("PRAGMA cache_size=-20000;")
         self.conn.execute("PRAGMA foreign_keys=ON;")
+        self.conn.execute("PRAGMA temp_store=MEMORY;")
+        # Up to 256 MiB of memory-mapped reads.
+        self.conn.execute("PRAGMA mmap_size=268435456;")
 
     def close(self) -> None:
         self.conn.close()
@@ -83,6 +235,12 @@ class Database:
             self.conn.execute(
                 "CREATE INDEX IF NOT EXISTS idx_messages_chat_thread_date ON messages(chat_id, thread_id, date_utc);"
             )
+            # Window queries (/latest stats and topic activity) filter on chat + date range only;
+            # this covering index answers them without touching the table rows.
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_messages_chat_date "
+                "ON messages(chat_id, date_utc, is_service, thread_id);"
+            )
 
             self.conn.execute(
                 """
@@ -156,40 +314,56 @@ class Database:
         search commands will be disabled but ingestion continues.
         """
         try:
+            existing = self.conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts';"
+            ).fetchone()
+            if existing is not None and _FTS_TOKENIZE not in str(existing["sql"]):
+                # Older databases use the default tokenizer; the index is external-content, so
+                # dropping it loses nothing and the rebuild below repopulates it.
+                log.info("Recreating messages_fts with tokenize=%r", _FTS_TOKENIZE)
+                self.conn.execute("DROP TABLE messages_fts;")
             self.conn.execute(
-                """
+                f"""
                 CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts
-                USING fts5(text, content='messages', content_rowid='id');
-                """
-            )
-            self.conn.execute(
-                """
-                CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
-                    INSERT INTO messages_fts(rowid, text) VALUES (new.id, coalesce(new.text, ''));
-                END;
-                """
-            )
-            self.conn.execute(
-                """
-                CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
-                    INSERT INTO messages_fts(messages_fts, rowid, text)
-                    VALUES ('delete', old.id, coalesce(old.text, ''));
-                END;
-                """
-            )
-            self.conn.execute(
-                """
-                CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE ON messages BEGIN
-                    INSERT INTO messages_fts(messages_fts, rowid, text)
-                    VALUES ('delete', old.id, coalesce(old.text, ''));
-                    INSERT INTO messages_fts(rowid, text) VALUES (new.id, coalesce(new.text, ''));
-                END;
+                USING fts5(text, content='messages', content_rowid='id', tokenize="{_FTS_TOKENIZE}");
                 """
             )
+            for trigger_sql in _FTS_TRIGGERS_SQL.values():
+                self.conn.execute(trigger_sql)
             self.conn.execute("INSERT INTO messages_fts(messages_fts) VALUES('rebuild');")
         except sqlite3.OperationalError:
             log.exception("FTS5 unavailable; /search will be disabled")
 
+    @contextmanager
+    def deferred_fts(self) -> Iterator[None]:
+        """
+        Suspend per-row FTS maintenance for a bulk load, then rebuild the index once.
+
+        The sync triggers are dropped on entry; on exit they are recreated and messages_fts is
+        rebuilt from the messages table. If the process dies in between, the next init_schema()
+        recreates the triggers and rebuilds the index anyway.
+        """
+        has_fts = (
+            self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts';"
+            ).fetchone()
+            is not None
+        )
+        if not has_fts:
+            yield
+            return
+
+        with self.conn:
+            for name in _FTS_TRIGGERS_SQL:
+                self.conn.execute(f"DROP TRIGGER IF EXISTS {name};")
+        try:
+            yield
+        finally:
+            with self.conn:
+                for trigger_sql in _FTS_TRIGGERS_SQL.values():
+                    self.conn.execute(trigger_sql)
+                self.conn.execute("INSERT INTO messages_fts(messages_fts) VALUES('rebuild');")
+
     def get_state(self, key: str) -> str | None:
         row = self.conn.execute("SELECT value FROM state WHERE key = ?;", (key,)).fetchone()
         if not row:
@@ -198,75 +372,40 @@ class Database:
 
     def set_state(self, key: str, value: str) -> None:
         with self.conn:
-            self.conn.execute(
-                """
-                INSERT INTO state(key, value) VALUES (?, ?)
-                ON CONFLICT(key) DO UPDATE SET value = excluded.value;
-                """,
-                (key, value),
-            )
+            self.conn.execute(_SET_STATE_SQL, (key, value))
 
     def upsert_message(self, record: dict[str, Any]) -> None:
+        self.upsert_messages_bulk([record])
+
+    def upsert_messages_bulk(self, records: Iterable[dict[str, Any]]) -> None:
+        """Upsert many message records in a single transaction."""
         with self.conn:
-            self.conn.execute(
-                """
-                INSERT INTO messages (
-                    chat_id,
-                    message_id,
-                    thread_id,
-                    date_utc,
-                    from_id,
-                    from_username,
-                    from_display,
-                    text,
-                    raw_json,
-                    reply_to_message_id,
-                    is_service,
-                    edit_date_utc,
-                    ingested_at_utc
-                ) VALUES (
-                    :chat_id,
-                    :message_id,
-                    :thread_id,
-                    :date_utc,
-                    :from_id,
-                    :from_username,
-                    :from_display,
-                    :text,
-                    :raw_json,
-                    :reply_to_message_id,
-                    :is_service,
-                    :edit_date_utc,
-                    :ingested_at_utc
-                )
-                ON CONFLICT(chat_id, message_id) DO UPDATE SET
-                    thread_id = COALESCE(excluded.thread_id, messages.thread_id),
-                    date_utc = excluded.date_utc,
-                    from_id = COALESCE(excluded.from_id, messages.from_id),
-                    from_username = COALESCE(excluded.from_username, messages.from_username),
-                    from_display = COALESCE(excluded.from_display, messages.from_display),
-                    text = COALESCE(excluded.text, messages.text),
-                    raw_json = excluded.raw_json,
-                    reply_to_message_id = COALESCE(excluded.reply_to_message_id, messages.reply_to_message_id),
-                    is_service = excluded.is_service,
-                    edit_date_utc = COALESCE(excluded.edit_date_utc, messages.edit_date_utc),
-                    ingested_at_utc = excluded.ingested_at_utc;
-                """,
-                record,
-            )
+            self.conn.executemany(_UPSERT_MESSAGE_SQL, records)
+
+    def upsert_ingest_batch(
+        self,
+        *,
+        messages: Iterable[dict[str, Any]],
+        topics: Iterable[dict[str, Any]],
+        ingested_at_utc: str,
+    ) -> None:
+        """
+        Write one batch of live updates in a single transaction.
+
+        Topic records use upsert_topic's keys and are applied in order, so a later
+        non-null title wins as it would with sequential upsert_topic calls.
+        """
+        with self.conn:
+            self.conn.executemany(_UPSERT_MESSAGE_SQL, messages)
+            self.conn.executemany(_UPSERT_TOPIC_SQL, topics)
+            self.conn.execute(_SET_STATE_SQL, ("last_ingest_at_utc", ingested_at_utc))
 
     def upsert_topic(
         self, *, chat_id: int, thread_id: int, title: str | None, now_utc_iso: str
     ) -> None:
         with self.conn:
             self.conn.execute(
-                """
-                INSERT INTO topics(chat_id, thread_id, title, created_at_utc, updated_at_utc)
-                VALUES (:chat_id, :thread_id, :title, :now_utc_iso, :now_utc_iso)
-                ON CONFLICT(chat_id, thread_id) DO UPDATE SET
-                    title = COALESCE(excluded.title, topics.title),
-                    updated_at_utc = excluded.updated_at_utc;
-                """,
+                _UPSERT_TOPIC_SQL,
                 {
                     "chat_id": chat_id,
                     "thread_id": thread_id,
@@ -598,6 +737,75 @@ class Database:
             )
         )
 
+    def get_messages_for_topics(
+        self,
+        *,
+        chat_id: int,
+        thread_ids: Iterable[int | None],
+        window_start_utc: str,
+        window_end_utc: str,
+        limit_per_topic: int,
+    ) -> dict[int | None, list[sqlite3.Row]]:
+        """
+        Batched `get_messages_for_topic`: one query for many threads.
+
+        Each thread keeps the same rows (and order) that `get_messages_for_topic`
+        would return for it.
+        """
+        ids = [tid for tid in thread_ids]
+        if not ids:
+            return {}
+
+        # thread_id can be NULL (no topic); match it alongside the IN list.
+        want_null = any(tid is None for tid in ids)
+        non_null = sorted({int(tid) for tid in ids if tid is not None})
+
+        thread_parts: list[str] = []
+        if non_null:
+            placeholders = ",".join(["?"] * len(non_null))
+            thread_parts.append(f"thread_id IN ({placeholders})")
+        if want_null:
+            thread_parts.append("thread_id IS NULL")
+        where_thread = " OR ".join(thread_parts)
+
+        rows = self.conn.execute(
+            f"""
+            SELECT
+                message_id,
+                thread_id,
+                date_utc,
+                from_username,
+                from_display,
+                text
+            FROM (
+                SELECT
+                    message_id,
+                    thread_id,
+                    date_utc,
+                    from_username,
+                    from_display,
+                    text,
+                    ROW_NUMBER() OVER (PARTITION BY thread_id ORDER BY date_utc ASC, id ASC) AS rn
+                FROM messages
+                WHERE
+                    chat_id = ?
+                    AND is_service = 0
+                    AND ({where_thread})
+                    AND date_utc >= ?
+                    AND date_utc <= ?
+            )
+            WHERE rn <= ?
+            ORDER BY thread_id, rn;
+            """,
+            (chat_id, *non_null, window_start_utc, window_end_utc, int(limit_per_topic)),
+        ).fetchall()
+
+        out: dict[int | None, list[sqlite3.Row]] = {}
+        for row in rows:
+            thread_id = int(row["thread_id"]) if row["thread_id"] is not None else None
+            out.setdefault(thread_id, []).append(row)
+        return out
+
     def get_topic_titles(self, *, chat_id: int, thread_ids: Iterable[int]) -> dict[int, str]:
         ids = [int(tid) for tid in thread_ids]
         if not ids:
@@ -628,98 +836,67 @@ class Database:
 
         Telegram Bot API doesn't provide a way to fetch a topic title by message_thread_id;
         instead we learn titles from forum service messages (forum_topic_created/edited).
-        This scans already-ingested raw_json payloads (updates/messages) to populate topics.
-        Returns the number of distinct thread_ids updated with a title.
+        This scans already-ingested raw_json payloads (updates/messages) to populate topics;
+        SQLite's JSON functions pull out just the fields we need, so full payloads are never
+        parsed in Python. Returns the number of distinct thread_ids updated with a title.
         """
 
-        params: list[Any] = [chat_id]
-        where = "m.chat_id = ? AND (m.raw_json LIKE '%forum_topic_created%' OR m.raw_json LIKE '%forum_topic_edited%')"
-
-        if thread_ids is not None:
+        if thread_ids is None:
+            thread_ids_json = None
+        else:
             ids = [int(tid) for tid in thread_ids]
             if not ids:
                 return 0
-            placeholders = ",".join(["?"] * len(ids))
-            where += f" AND m.thread_id IN ({placeholders})"
-            params.extend(ids)
-
-        params.append(int(limit))
+            thread_ids_json = json.dumps(ids)
 
         rows = self.conn.execute(
-            f"""
-            SELECT m.thread_id, m.raw_json
-            FROM messages m
-            WHERE {where}
-            ORDER BY m.date_utc DESC
-            LIMIT ?;
-            """,
-            params,
+            _BACKFILL_TOPIC_TITLES_SQL,
+            {"chat_id": chat_id, "thread_ids": thread_ids_json, "limit": int(limit)},
         ).fetchall()
 
+        updates: list[dict[str, Any]] = []
         updated_threads: set[int] = set()
 
         for row in rows:
-            fallback_thread_id = int(row["thread_id"]) if row["thread_id"] is not None else None
-            raw = row["raw_json"]
-            if not isinstance(raw, str):
-                continue
-
-            try:
-                obj = json.loads(raw)
-            except json.JSONDecodeError:
-                continue
-
-            message = None
-            if isinstance(obj, dict) and ("message" in obj or "edited_message" in obj):
-                msg = obj.get("message") or obj.get("edited_message")
-                if isinstance(msg, dict):
-                    message = msg
-            elif isinstance(obj, dict):
-                # Some ingestors store message objects directly.
-                message = obj
-
-            if not isinstance(message, dict):
-                continue
-
-            def _extract_name(container: Any) -> str | None:
-                if not isinstance(container, dict):
-                    return None
-                name = container.get("name")
-                return name.strip() if isinstance(name, str) and name.strip() else None
-
-            title = _extract_name(message.get("forum_topic_created")) or _extract_name(
-                message.get("forum_topic_edited")
-            )
-            thread_id = (
-                message.get("message_thread_id") if isinstance(message.get("message_thread_id"), int) else None
-            )
+            (
+                thread_id,
+                created_name,
+                edited_name,
+                reply_thread_id,
+                reply_message_id,
+                reply_created_name,
+                reply_edited_name,
+            ) = orjson.loads(row["fields"])
+            if not isinstance(thread_id, int):
+                thread_id = None
+            title = _clean_topic_name(created_name) or _clean_topic_name(edited_name)
 
             # Some updates include the topic create message in reply_to_message.
-            if title is None and isinstance(message.get("reply_to_message"), dict):
-                reply = message["reply_to_message"]
-                title = _extract_name(reply.get("forum_topic_created")) or _extract_name(
-                    reply.get("forum_topic_edited")
-                )
-                thread_id = (
-                    reply.get("message_thread_id")
-                    if isinstance(reply.get("message_thread_id"), int)
-                    else reply.get("message_id")
-                    if isinstance(reply.get("message_id"), int)
-                    else thread_id
-                )
-
-            resolved_thread_id = int(thread_id) if isinstance(thread_id, int) else fallback_thread_id
+            if title is None:
+                title = _clean_topic_name(reply_created_name) or _clean_topic_name(reply_edited_name)
+                if isinstance(reply_thread_id, int):
+                    thread_id = reply_thread_id
+                elif isinstance(reply_message_id, int):
+                    thread_id = reply_message_id
+
+            resolved_thread_id = thread_id if thread_id is not None else row["fallback_thread_id"]
             if resolved_thread_id is None or title is None:
                 continue
 
-            self.upsert_topic(
-                chat_id=chat_id,
-                thread_id=resolved_thread_id,
-                title=title,
-                now_utc_iso=now_utc_iso,
+            updates.append(
+                {
+                    "chat_id": chat_id,
+                    "thread_id": resolved_thread_id,
+                    "title": title,
+                    "now_utc_iso": now_utc_iso,
+                }
             )
             updated_threads.add(resolved_thread_id)
 
+        if updates:
+            with self.conn:
+                self.conn.executemany(_UPSERT_TOPIC_SQL, updates)
+
         return len(updated_threads)
 
     def backfill_topic_titles_from_message_text(
@@ -777,7 +954,7 @@ class Database:
         window_start_utc: str | None = None,
         window_end_utc: str | None = None,
     ) -> list[SearchHit]:
-        where_parts = ["m.chat_id = :chat_id", "messages_fts MATCH :query"]
+        where_parts = ["m.chat_id = :chat_id"]
         params: dict[str, Any] = {"chat_id": chat_id, "query": query, "limit": limit}
         if window_start_utc is not None:
             where_parts.append("m.date_utc >= :window_start_utc")
@@ -788,9 +965,19 @@ class Database:
 
         where_sql = " AND ".join(where_parts)
 
+        # Materialize the FTS matches first so the planner can't switch to walking messages by
+        # chat_id and probing the FTS index per row once the table grows.
         try:
             rows = self.conn.execute(
                 f"""
+                WITH fts_matches AS MATERIALIZED (
+                    SELECT
+                        rowid,
+                        bm25(messages_fts) AS score,
+                        snippet(messages_fts, 0, '[', ']', '…', 10) AS snippet
+                    FROM messages_fts
+                    WHERE messages_fts MATCH :query
+                )
                 SELECT
                     m.chat_id,
                     m.message_id,
@@ -799,11 +986,11 @@ class Database:
                     m.from_display,
                     m.from_username,
                     m.text,
-                    snippet(messages_fts, 0, '[', ']', '…', 10) AS snippet
-                FROM messages_fts
-                JOIN messages m ON m.id = messages_fts.rowid
+                    f.snippet
+                FROM fts_matches f
+                JOIN messages m ON m.id = f.rowid
                 WHERE {where_sql}
-                ORDER BY bm25(messages_fts)
+                ORDER BY f.score
                 LIMIT :limit;
                 """,
                 params,
@@ -1,23 +1,33 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from datetime import datetime, timezone
-import re
+from functools import lru_cache
 from typing import Any
 
 from src.commands.latest import build_latest_brief
 from src.config import Config
 from src.db import Database
+from src.util.time import unix_to_iso_utc
 
 
 _MAX_BUTTON_TEXT = 24
-_WS_RE = re.compile(r"\s+")
+
+# (text, action) buttons; the main keyboard opens "menu" callbacks, topic views "do" callbacks.
+_MAIN_BUTTONS = (("Teach me", "teach"), ("Receipts", "receipts"), ("Links", "links"))
+_TOPIC_VIEW_ROWS: dict[str, tuple[tuple[tuple[str, str], ...], ...]] = {
+    "teach": ((("Details", "teach_detail"),), (("Receipts", "receipts"), ("Links", "links"))),
+    "teach_detail": ((("Summary", "teach"),), (("Receipts", "receipts"), ("Links", "links"))),
+    "receipts": ((("Teach me", "teach"), ("Links", "links")),),
+    "links": ((("Teach me", "teach"), ("Receipts", "receipts")),),
+}
+_TOPIC_VIEW_PICKER = {"teach": "teach", "teach_detail": "teach", "receipts": "receipts", "links": "links"}
 
 
 def _to_iso_utc(ts: int) -> str:
-    return datetime.fromtimestamp(int(ts), tz=timezone.utc).replace(microsecond=0).isoformat()
+    return unix_to_iso_utc(ts)
 
 
+@lru_cache(maxsize=1024)
 def _format_window_label(*, start_ts: int, end_ts: int) -> str:
     seconds = max(0, int(end_ts) - int(start_ts))
     if seconds <= 0:
@@ -37,8 +47,9 @@ def _format_window_label(*, start_ts: int, end_ts: int) -> str:
     return f"last {weeks}w"
 
 
+@lru_cache(maxsize=1024)
 def _short_label(label: str) -> str:
-    cleaned = _WS_RE.sub(" ", label).strip()
+    cleaned = " ".join(label.split())
     if len(cleaned) <= _MAX_BUTTON_TEXT:
         return cleaned
     return cleaned[: _MAX_BUTTON_TEXT - 1].rstrip() + "…"
@@ -54,7 +65,7 @@ def _decode_thread_id(token: str) -> int | None:
     return int(token)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class DigestCallback:
     start_ts: int
     end_ts: int
@@ -63,59 +74,42 @@ class DigestCallback:
     thread_id: int | None = None
 
 
+def _callback_prefix(*, start_ts: int, end_ts: int, kind: str) -> str:
+    return f"dg|{int(start_ts)}|{int(end_ts)}|{kind}|"
+
+
+@lru_cache(maxsize=4096)
 def encode_digest_callback(cb: DigestCallback) -> str:
-    base = f"dg|{int(cb.start_ts)}|{int(cb.end_ts)}|{cb.kind}|{cb.action}"
+    base = _callback_prefix(start_ts=cb.start_ts, end_ts=cb.end_ts, kind=cb.kind) + cb.action
     if cb.kind == "do":
-        return base + f"|{_encode_thread_id(cb.thread_id)}"
+        return base + "|" + _encode_thread_id(cb.thread_id)
     return base
 
 
+@lru_cache(maxsize=1024)
 def parse_digest_callback(data: str) -> DigestCallback | None:
-    parts = [p.strip() for p in data.split("|")]
+    # Callback data is produced by encode_digest_callback, so no whitespace handling is needed.
+    # The text format is kept (rather than packed binary) so buttons already posted keep working.
+    parts = data.split("|", 5)
     if len(parts) < 5 or parts[0] != "dg":
         return None
+    kind = parts[3]
+    if kind != "menu" and kind != "do":
+        return None
     try:
         start_ts = int(parts[1])
         end_ts = int(parts[2])
+        thread_id = _decode_thread_id(parts[5] if len(parts) == 6 else "n") if kind == "do" else None
     except ValueError:
         return None
-    kind = parts[3]
-    action = parts[4]
-    if kind not in {"menu", "do"}:
-        return None
-    thread_id = None
-    if kind == "do":
-        token = parts[5] if len(parts) >= 6 else "n"
-        try:
-            thread_id = _decode_thread_id(token)
-        except ValueError:
-            return None
-    return DigestCallback(start_ts=start_ts, end_ts=end_ts, kind=kind, action=action, thread_id=thread_id)
+    return DigestCallback(start_ts=start_ts, end_ts=end_ts, kind=kind, action=parts[4], thread_id=thread_id)
 
 
 def build_digest_main_keyboard(*, start_ts: int, end_ts: int) -> dict[str, Any]:
+    menu_prefix = _callback_prefix(start_ts=start_ts, end_ts=end_ts, kind="menu")
     return {
         "inline_keyboard": [
-            [
-                {
-                    "text": "Teach me",
-                    "callback_data": encode_digest_callback(
-                        DigestCallback(start_ts, end_ts, "menu", "teach")
-                    ),
-                },
-                {
-                    "text": "Receipts",
-                    "callback_data": encode_digest_callback(
-                        DigestCallback(start_ts, end_ts, "menu", "receipts")
-                    ),
-                },
-                {
-                    "text": "Links",
-                    "callback_data": encode_digest_callback(
-                        DigestCallback(start_ts, end_ts, "menu", "links")
-                    ),
-                },
-            ]
+            [{"text": text, "callback_data": menu_prefix + action} for text, action in _MAIN_BUTTONS]
         ]
     }
 
@@ -145,117 +139,23 @@ def build_digest_topic_view_keyboard(
     thread_id: int | None,
     view: str,
 ) -> dict[str, Any]:
-    if view not in {"teach", "teach_detail", "receipts", "links"}:
+    view_rows = _TOPIC_VIEW_ROWS.get(view)
+    if view_rows is None:
         raise ValueError(f"Unsupported view: {view!r}")
 
-    rows: list[list[dict[str, str]]] = []
-    if view == "teach":
-        rows.append(
-            [
-                {
-                    "text": "Details",
-                    "callback_data": encode_digest_callback(
-                        DigestCallback(start_ts=start_ts, end_ts=end_ts, kind="do", action="teach_detail", thread_id=thread_id)
-                    ),
-                }
-            ]
-        )
-        rows.append(
-            [
-                {
-                    "text": "Receipts",
-                    "callback_data": encode_digest_callback(
-                        DigestCallback(start_ts=start_ts, end_ts=end_ts, kind="do", action="receipts", thread_id=thread_id)
-                    ),
-                },
-                {
-                    "text": "Links",
-                    "callback_data": encode_digest_callback(
-                        DigestCallback(start_ts=start_ts, end_ts=end_ts, kind="do", action="links", thread_id=thread_id)
-                    ),
-                },
-            ]
-        )
-        picker_action = "teach"
-    elif view == "teach_detail":
-        rows.append(
-            [
-                {
-                    "text": "Summary",
-                    "callback_data": encode_digest_callback(
-                        DigestCallback(start_ts=start_ts, end_ts=end_ts, kind="do", action="teach", thread_id=thread_id)
-                    ),
-                }
-            ]
-        )
-        rows.append(
-            [
-                {
-                    "text": "Receipts",
-                    "callback_data": encode_digest_callback(
-                        DigestCallback(start_ts=start_ts, end_ts=end_ts, kind="do", action="receipts", thread_id=thread_id)
-                    ),
-                },
-                {
-                    "text": "Links",
-                    "callback_data": encode_digest_callback(
-                        DigestCallback(start_ts=start_ts, end_ts=end_ts, kind="do", action="links", thread_id=thread_id)
-                    ),
-                },
-            ]
-        )
-        picker_action = "teach"
-    elif view == "receipts":
-        rows.append(
-            [
-                {
-                    "text": "Teach me",
-                    "callback_data": encode_digest_callback(
-                        DigestCallback(start_ts=start_ts, end_ts=end_ts, kind="do", action="teach", thread_id=thread_id)
-                    ),
-                },
-                {
-                    "text": "Links",
-                    "callback_data": encode_digest_callback(
-                        DigestCallback(start_ts=start_ts, end_ts=end_ts, kind="do", action="links", thread_id=thread_id)
-                    ),
-                },
-            ]
-        )
-        picker_action = "receipts"
-    else:
-        rows.append(
-            [
-                {
-                    "text": "Teach me",
-                    "callback_data": encode_digest_callback(
-                        DigestCallback(start_ts=start_ts, end_ts=end_ts, kind="do", action="teach", thread_id=thread_id)
-                    ),
-                },
-                {
-                    "text": "Receipts",
-                    "callback_data": encode_digest_callback(
-                        DigestCallback(start_ts=start_ts, end_ts=end_ts, kind="do", action="receipts", thread_id=thread_id)
-                    ),
-                },
-            ]
-        )
-        picker_action = "links"
+    # All buttons share the window (and topic, for "do"), so build those parts once.
+    do_prefix = _callback_prefix(start_ts=start_ts, end_ts=end_ts, kind="do")
+    menu_prefix = _callback_prefix(start_ts=start_ts, end_ts=end_ts, kind="menu")
+    thread_suffix = "|" + _encode_thread_id(thread_id)
 
+    rows: list[list[dict[str, str]]] = [
+        [{"text": text, "callback_data": do_prefix + action + thread_suffix} for text, action in row]
+        for row in view_rows
+    ]
     rows.append(
         [
-            {
-                "text": "Pick topic",
-                "callback_data": encode_digest_callback(
-                    DigestCallback(start_ts=start_ts, end_ts=end_ts, kind="menu", action=picker_action)
-                ),
-            },
-            {
-                "text": "Back",
-                "callback_data": encode_digest_callback(
-                    DigestCallback(start_ts=start_ts, end_ts=end_ts, kind="menu", action="main")
-                ),
-            },
+            {"text": "Pick topic", "callback_data": menu_prefix + _TOPIC_VIEW_PICKER[view]},
+            {"text": "Back", "callback_data": menu_prefix + "main"},
         ]
     )
 
@@ -1,24 +1,28 @@
 from __future__ import annotations
 
 import argparse
+from contextlib import nullcontext
 from datetime import datetime, timezone
-import json
+from functools import lru_cache
 import logging
 import os
-import re
-from typing import Any
+from typing import Any, Iterator
 
 from dotenv import load_dotenv
+import orjson
 
 from src.db import Database
-from src.util.time import now_utc, to_iso_utc
+from src.util.time import now_utc, to_iso_utc, unix_to_iso_utc
 from src.util.logging import configure_logging
 
 
 log = logging.getLogger(__name__)
 
 
-_FROM_ID_RE = re.compile(r"^(?:user|channel|chat)(\d+)$")
+_UPSERT_BATCH_SIZE = 5000
+
+
+_FROM_ID_PREFIXES = ("user", "channel", "chat")
 
 
 def _parse_export_from_id(value: Any) -> int | None:
@@ -28,36 +32,45 @@ def _parse_export_from_id(value: Any) -> int | None:
         return value
     if isinstance(value, str):
         value = value.strip()
-        if value.isdigit():
+        # isdecimal() matches exactly the digits int() accepts (isdigit() also admits "²").
+        if value.isdecimal():
             return int(value)
-        match = _FROM_ID_RE.match(value)
-        if match:
-            return int(match.group(1))
+        for prefix in _FROM_ID_PREFIXES:
+            if value.startswith(prefix):
+                rest = value[len(prefix) :]
+                if rest.isdecimal():
+                    return int(rest)
+                break
     return None
 
 
+def _iter_text_fragments(text_field: list[Any]) -> Iterator[str]:
+    for item in text_field:
+        # Exact type checks are fine here: values come straight from the JSON parser.
+        if type(item) is str:
+            yield item
+        elif type(item) is dict:
+            # Telegram export fragments often look like:
+            # {"type":"bold","text":"foo"} or {"type":"link","text":"...","href":"..."}
+            fragment_text = item.get("text")
+            if type(fragment_text) is str:
+                yield fragment_text
+
+
 def _normalize_export_text(text_field: Any) -> str | None:
-    if text_field is None:
-        return None
-    if isinstance(text_field, str):
+    if type(text_field) is str:
         return text_field
-    if isinstance(text_field, list):
-        parts: list[str] = []
-        for item in text_field:
-            if isinstance(item, str):
-                parts.append(item)
-                continue
-            if isinstance(item, dict):
-                # Telegram export fragments often look like:
-                # {"type":"bold","text":"foo"} or {"type":"link","text":"...","href":"..."}
-                fragment_text = item.get("text")
-                if isinstance(fragment_text, str):
-                    parts.append(fragment_text)
-        joined = "".join(parts)
-        return joined if joined else None
+    if type(text_field) is list:
+        return "".join(_iter_text_fragments(text_field)) or None
     return None
 
 
+@lru_cache(maxsize=1 << 16)
+def _ts_to_iso_cached(ts: int) -> str:
+    # Consecutive messages in an export often share the same second.
+    return unix_to_iso_utc(ts)
+
+
 def _parse_export_unixtime(value: Any) -> str | None:
     if value is None:
         return None
@@ -65,7 +78,7 @@ def _parse_export_unixtime(value: Any) -> str | None:
         ts = int(value)
     except (TypeError, ValueError):
         return None
-    return datetime.fromtimestamp(ts, tz=timezone.utc).replace(microsecond=0).isoformat()
+    return _ts_to_iso_cached(ts)
 
 
 def _extract_messages(payload: Any, *, export_chat_name: str | None) -> list[dict[str, Any]]:
@@ -95,49 +108,58 @@ def _extract_messages(payload: Any, *, export_chat_name: str | None) -> list[dic
     raise SystemExit("Unrecognized Telegram export JSON structure (expected 'messages' list)")
 
 
-def _extract_export_topics(messages: list[dict[str, Any]]) -> dict[int, str]:
+def _scan_messages(messages: list[dict[str, Any]]) -> tuple[dict[int, str], bool, dict[int, int]]:
+    """
+    Single pre-pass over the export: topic roots, whether topics exist, and reply edges.
+    """
     topics: dict[int, str] = {}
+    has_topics = False
+    reply_to: dict[int, int] = {}
     for msg in messages:
         if not isinstance(msg, dict):
             continue
-        if msg.get("type") != "service":
-            continue
-        if msg.get("action") != "topic_created":
-            continue
         message_id = msg.get("id")
-        title = msg.get("title")
-        if isinstance(message_id, int) and isinstance(title, str) and title.strip():
-            topics[message_id] = title.strip()
-    return topics
+        if not isinstance(message_id, int):
+            message_id = None
 
+        parent = msg.get("reply_to_message_id")
+        if message_id is not None and isinstance(parent, int):
+            reply_to[message_id] = parent
 
-def _export_has_topics(messages: list[dict[str, Any]]) -> bool:
-    for msg in messages:
-        if not isinstance(msg, dict):
-            continue
         if msg.get("type") != "service":
             continue
-        if msg.get("action") in {"topic_created", "topic_edit"}:
-            return True
-    return False
+        action = msg.get("action")
+        if action == "topic_created":
+            has_topics = True
+            title = msg.get("title")
+            if message_id is not None and isinstance(title, str) and title.strip():
+                topics[message_id] = title.strip()
+        elif action == "topic_edit":
+            has_topics = True
+    return topics, has_topics, reply_to
+
+
+_WALKING = object()
+_UNRESOLVED = object()
 
 
 def _resolve_export_thread_ids(
-    *, messages: list[dict[str, Any]], topic_roots: dict[int, str], assume_general_thread: bool
+    *,
+    messages: list[dict[str, Any]],
+    reply_to: dict[int, int],
+    topic_roots: dict[int, str],
+    assume_general_thread: bool,
 ) -> dict[int, int | None]:
-    reply_to: dict[int, int] = {}
-    for msg in messages:
-        if not isinstance(msg, dict):
-            continue
-        message_id = msg.get("id")
-        parent = msg.get("reply_to_message_id")
-        if isinstance(message_id, int) and isinstance(parent, int):
-            reply_to[message_id] = parent
+    parent_of = reply_to.get
 
-    cache: dict[int, int | None] = {}
+    # Maps message id -> thread id; nodes on the chain being walked hold _WALKING until resolved.
+    cache: dict[int, Any] = {}
 
     general_thread_id: int | None = 1 if assume_general_thread else None
 
+    # Scratch buffer reused across messages; every node walked is memoized below.
+    path: list[int] = []
+
     for msg in messages:
         if not isinstance(msg, dict):
             continue
@@ -147,27 +169,26 @@ def _resolve_export_thread_ids(
         if message_id in cache:
             continue
 
-        path: list[int] = []
+        path.clear()
         cur = message_id
-        seen: set[int] = set()
 
         while True:
-            if cur in cache:
-                root = cache[cur]
-                break
             if cur in topic_roots:
                 root = cur
                 break
-
-            parent = reply_to.get(cur)
-            if parent is None:
+            root = cache.get(cur, _UNRESOLVED)
+            if root is _WALKING:
+                # Reply cycle: the chain came back to a node on the current path.
                 root = general_thread_id
                 break
+            if root is not _UNRESOLVED:
+                break
 
-            if cur in seen:
+            parent = parent_of(cur)
+            if parent is None:
                 root = general_thread_id
                 break
-            seen.add(cur)
+            cache[cur] = _WALKING
 
             path.append(cur)
             cur = parent
@@ -179,6 +200,55 @@ def _resolve_export_thread_ids(
     return cache
 
 
+def _export_row(
+    msg: Any, *, chat_id: int, thread_ids: dict[int, int | None], ingested_at_utc: str
+) -> dict[str, Any] | None:
+    """
+    Normalize one exported message into an upsert record, or None if it must be skipped.
+    """
+    if not isinstance(msg, dict):
+        return None
+
+    message_id = msg.get("id")
+    if not isinstance(message_id, int):
+        return None
+
+    date_utc = _parse_export_unixtime(msg.get("date_unixtime")) or None
+    if not date_utc:
+        # Fallback: keep best-effort ISO string as UTC.
+        date_str = msg.get("date")
+        if isinstance(date_str, str):
+            try:
+                parsed = datetime.fromisoformat(date_str)
+                if parsed.tzinfo is None:
+                    parsed = parsed.replace(tzinfo=timezone.utc)
+                date_utc = to_iso_utc(parsed)
+            except ValueError:
+                date_utc = None
+    if not date_utc:
+        return None
+
+    edit_date_utc = _parse_export_unixtime(msg.get("edited_unixtime"))
+    from_display = msg.get("from")
+    reply_to_message_id = msg.get("reply_to_message_id")
+
+    return {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "thread_id": thread_ids.get(message_id),
+        "date_utc": date_utc,
+        "from_id": _parse_export_from_id(msg.get("from_id")),
+        "from_username": None,
+        "from_display": from_display if isinstance(from_display, str) else None,
+        "text": _normalize_export_text(msg.get("text")),
+        "raw_json": orjson.dumps(msg).decode("utf-8"),
+        "reply_to_message_id": reply_to_message_id if isinstance(reply_to_message_id, int) else None,
+        "is_service": 0 if msg.get("type") == "message" else 1,
+        "edit_date_utc": edit_date_utc,
+        "ingested_at_utc": ingested_at_utc,
+    }
+
+
 def import_export_json(
     *,
     db: Database,
@@ -186,73 +256,66 @@ def import_export_json(
     payload: Any,
     ingested_at_utc: str,
     export_chat_name: str | None = None,
+    defer_fts: bool = False,
 ) -> tuple[int, int]:
     messages = _extract_messages(payload, export_chat_name=export_chat_name)
 
-    topics = _extract_export_topics(messages)
-    has_topics = _export_has_topics(messages)
+    topics, has_topics, reply_to = _scan_messages(messages)
     if has_topics:
         db.upsert_topic(chat_id=chat_id, thread_id=1, title="General", now_utc_iso=ingested_at_utc)
     for thread_id, title in topics.items():
         db.upsert_topic(chat_id=chat_id, thread_id=thread_id, title=title, now_utc_iso=ingested_at_utc)
 
     thread_ids = _resolve_export_thread_ids(
-        messages=messages, topic_roots=topics, assume_general_thread=has_topics
+        messages=messages, reply_to=reply_to, topic_roots=topics, assume_general_thread=has_topics
     )
 
     inserted = 0
     skipped = 0
+    batch: list[dict[str, Any]] = []
+
+    # defer_fts skips the per-row FTS triggers and rebuilds the search index once at the end,
+    # which is much cheaper for large exports.
+    with db.deferred_fts() if defer_fts else nullcontext():
+        for msg in messages:
+            row = _export_row(msg, chat_id=chat_id, thread_ids=thread_ids, ingested_at_utc=ingested_at_utc)
+            if row is None:
+                skipped += 1
+                continue
 
-    for msg in messages:
-        if not isinstance(msg, dict):
-            skipped += 1
-            continue
+            batch.append(row)
+            inserted += 1
+            if len(batch) >= _UPSERT_BATCH_SIZE:
+                db.upsert_messages_bulk(batch)
+                batch.clear()
 
-        message_id = msg.get("id")
-        if not isinstance(message_id, int):
-            skipped += 1
-            continue
+        if batch:
+            db.upsert_messages_bulk(batch)
 
-        date_utc = _parse_export_unixtime(msg.get("date_unixtime")) or None
-        if not date_utc:
-            # Fallback: keep best-effort ISO string as UTC.
-            date_str = msg.get("date")
-            if isinstance(date_str, str):
-                try:
-                    parsed = datetime.fromisoformat(date_str)
-                    if parsed.tzinfo is None:
-                        parsed = parsed.replace(tzinfo=timezone.utc)
-                    date_utc = to_iso_utc(parsed)
-                except ValueError:
-                    date_utc = None
-        if not date_utc:
-            skipped += 1
-            continue
+    return inserted, skipped
 
-        edit_date_utc = _parse_export_unixtime(msg.get("edited_unixtime"))
-
-        db.upsert_message(
-            {
-                "chat_id": chat_id,
-                "message_id": message_id,
-                "thread_id": thread_ids.get(message_id),
-                "date_utc": date_utc,
-                "from_id": _parse_export_from_id(msg.get("from_id")),
-                "from_username": None,
-                "from_display": msg.get("from") if isinstance(msg.get("from"), str) else None,
-                "text": _normalize_export_text(msg.get("text")),
-                "raw_json": json.dumps(msg, ensure_ascii=False, separators=(",", ":")),
-                "reply_to_message_id": msg.get("reply_to_message_id")
-                if isinstance(msg.get("reply_to_message_id"), int)
-                else None,
-                "is_service": 0 if msg.get("type") == "message" else 1,
-                "edit_date_utc": edit_date_utc,
-                "ingested_at_utc": ingested_at_utc,
-            }
-        )
-        inserted += 1
 
-    return inserted, skipped
+def _import_export_file(
+    *,
+    db: Database,
+    chat_id: int,
+    path: str,
+    ingested_at_utc: str,
+    export_chat_name: str | None,
+    defer_fts: bool = False,
+) -> tuple[int, int]:
+    # Keep the parsed payload local so each export is released before the next one
+    # is parsed; otherwise two full exports are alive at once when passing --path a b.
+    with open(path, "rb") as f:
+        payload = orjson.loads(f.read())
+    return import_export_json(
+        db=db,
+        chat_id=chat_id,
+        payload=payload,
+        ingested_at_utc=ingested_at_utc,
+        export_chat_name=export_chat_name,
+        defer_fts=defer_fts,
+    )
 
 
 def main() -> None:
@@ -288,14 +351,13 @@ def main() -> None:
 
     for path in args.path:
         log.info("Importing %s", path)
-        with open(path, "r", encoding="utf-8") as f:
-            payload = json.load(f)
-        inserted, skipped = import_export_json(
+        inserted, skipped = _import_export_file(
             db=db,
             chat_id=args.chat_id,
-            payload=payload,
+            path=path,
             ingested_at_utc=ingested_at,
             export_chat_name=args.export_chat_name,
+            defer_fts=True,
         )
         log.info("Imported=%s skipped=%s from %s", inserted, skipped, path)
         total_inserted += inserted
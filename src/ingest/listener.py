@@ -1,74 +1,83 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
-import json
 import logging
 from typing import Any
 
+import orjson
+
 from src.config import Config
 from src.db import Database
-from src.util.time import now_utc, to_iso_utc
+from src.util.time import now_utc, to_iso_utc, unix_to_iso_utc
 
 
 log = logging.getLogger(__name__)
 
 
-_SERVICE_KEYS = {
-    "forum_topic_created",
-    "forum_topic_edited",
-    "new_chat_members",
-    "left_chat_member",
-    "pinned_message",
-    "new_chat_title",
-    "delete_chat_photo",
-    "group_chat_created",
-    "supergroup_chat_created",
-    "channel_chat_created",
-    "message_auto_delete_timer_changed",
-    "migrate_to_chat_id",
-    "migrate_from_chat_id",
-}
+_SERVICE_KEYS = frozenset(
+    {
+        "forum_topic_created",
+        "forum_topic_edited",
+        "new_chat_members",
+        "left_chat_member",
+        "pinned_message",
+        "new_chat_title",
+        "delete_chat_photo",
+        "group_chat_created",
+        "supergroup_chat_created",
+        "channel_chat_created",
+        "message_auto_delete_timer_changed",
+        "migrate_to_chat_id",
+        "migrate_from_chat_id",
+    }
+)
 
 
 def _iso_from_unix_seconds(value: Any) -> str | None:
     if not isinstance(value, int):
         return None
-    return datetime.fromtimestamp(value, tz=timezone.utc).replace(microsecond=0).isoformat()
+    return unix_to_iso_utc(value)
 
 
-def ingest_update(*, db: Database, config: Config, update: dict[str, Any]) -> None:
+def _prepare_update(
+    *, config: Config, update: dict[str, Any], ingested_at_utc: str
+) -> tuple[dict[str, Any] | None, list[dict[str, Any]]]:
+    """
+    Turn one update into a message record plus the topic upserts it implies.
+    """
+    topics: list[dict[str, Any]] = []
     message = update.get("message") or update.get("edited_message")
     kind = "message" if "message" in update else ("edited_message" if "edited_message" in update else None)
     if kind is None or not isinstance(message, dict):
-        return
-
-    chat_id = message.get("chat", {}).get("id")
-    if not isinstance(chat_id, int):
-        return
+        return None, topics
 
-    allowed_chat_ids = {config.source_chat_id, *config.control_chat_ids}
-    if chat_id not in allowed_chat_ids:
-        return
+    # Filter on chat first so updates from other chats skip all further parsing.
+    chat_obj = message.get("chat", {})
+    chat_id = chat_obj.get("id")
+    if not isinstance(chat_id, int) or chat_id not in config.allowed_chat_ids:
+        return None, topics
 
     message_id = message.get("message_id")
     if not isinstance(message_id, int):
-        return
+        return None, topics
 
     date_utc = _iso_from_unix_seconds(message.get("date"))
     if not date_utc:
-        return
-
-    ingested_at_utc = to_iso_utc(now_utc())
-
-    from_obj = message.get("from") if isinstance(message.get("from"), dict) else {}
-    first_name = from_obj.get("first_name") if isinstance(from_obj.get("first_name"), str) else None
-    last_name = from_obj.get("last_name") if isinstance(from_obj.get("last_name"), str) else None
-    from_display = " ".join([part for part in [first_name, last_name] if part]) or None
-
-    thread_id = message.get("message_thread_id") if isinstance(message.get("message_thread_id"), int) else None
+        return None, topics
+
+    from_obj = message.get("from")
+    if not isinstance(from_obj, dict):
+        from_obj = {}
+    first_name = from_obj.get("first_name")
+    last_name = from_obj.get("last_name")
+    from_display = " ".join(part for part in (first_name, last_name) if part and isinstance(part, str)) or None
+    from_id = from_obj.get("id")
+    from_username = from_obj.get("username")
+
+    thread_id = message.get("message_thread_id")
+    if not isinstance(thread_id, int):
+        thread_id = None
     
     # In forum groups, messages without message_thread_id belong to the General thread (id=1)
-    chat_obj = message.get("chat", {})
     is_forum = chat_obj.get("is_forum") is True
     if thread_id is None and is_forum:
         thread_id = 1
@@ -77,38 +86,35 @@ def ingest_update(*, db: Database, config: Config, update: dict[str, Any]) -> No
     if isinstance(reply_to, dict) and isinstance(reply_to.get("message_id"), int):
         reply_to_message_id = int(reply_to["message_id"])
 
-    text = None
-    if isinstance(message.get("text"), str):
-        text = message["text"]
-    elif isinstance(message.get("caption"), str):
-        text = message["caption"]
+    text = message.get("text")
+    if not isinstance(text, str):
+        text = message.get("caption")
+        if not isinstance(text, str):
+            text = None
 
-    is_service = 1 if any(k in message for k in _SERVICE_KEYS) else 0
+    service_present = message.keys() & _SERVICE_KEYS
+    is_service = 1 if service_present else 0
 
     edit_date_utc = _iso_from_unix_seconds(message.get("edit_date")) if kind == "edited_message" else None
 
-    db.upsert_message(
-        {
-            "chat_id": chat_id,
-            "message_id": message_id,
-            "thread_id": thread_id,
-            "date_utc": date_utc,
-            "from_id": int(from_obj["id"]) if isinstance(from_obj.get("id"), int) else None,
-            "from_username": from_obj.get("username") if isinstance(from_obj.get("username"), str) else None,
-            "from_display": from_display,
-            "text": text,
-            "raw_json": json.dumps(update, ensure_ascii=False, separators=(",", ":")),
-            "reply_to_message_id": reply_to_message_id,
-            "is_service": is_service,
-            "edit_date_utc": edit_date_utc,
-            "ingested_at_utc": ingested_at_utc,
-        }
-    )
-
-    db.set_state("last_ingest_at_utc", ingested_at_utc)
+    record = {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "thread_id": thread_id,
+        "date_utc": date_utc,
+        "from_id": int(from_id) if isinstance(from_id, int) else None,
+        "from_username": from_username if isinstance(from_username, str) else None,
+        "from_display": from_display,
+        "text": text,
+        "raw_json": orjson.dumps(update).decode("utf-8"),
+        "reply_to_message_id": reply_to_message_id,
+        "is_service": is_service,
+        "edit_date_utc": edit_date_utc,
+        "ingested_at_utc": ingested_at_utc,
+    }
 
     if thread_id is not None and chat_id == config.source_chat_id:
-        db.upsert_topic(chat_id=chat_id, thread_id=thread_id, title=None, now_utc_iso=ingested_at_utc)
+        topics.append({"chat_id": chat_id, "thread_id": thread_id, "title": None, "now_utc_iso": ingested_at_utc})
 
     # Topic title best-effort mapping: sometimes a normal message is a reply to the
     # topic creation service message, which includes the name.
@@ -130,21 +136,56 @@ def ingest_update(*, db: Database, config: Config, update: dict[str, Any]) -> No
                 else None
             )
             if reply_thread_id is None or int(reply_thread_id) == int(thread_id):
-                db.upsert_topic(
-                    chat_id=chat_id,
-                    thread_id=int(thread_id),
-                    title=title,
-                    now_utc_iso=ingested_at_utc,
+                topics.append(
+                    {
+                        "chat_id": chat_id,
+                        "thread_id": int(thread_id),
+                        "title": title,
+                        "now_utc_iso": ingested_at_utc,
+                    }
                 )
 
-    if isinstance(message.get("forum_topic_created"), dict) and thread_id is not None:
-        title = message["forum_topic_created"].get("name")
-        title = title if isinstance(title, str) else None
-        db.upsert_topic(chat_id=chat_id, thread_id=thread_id, title=title, now_utc_iso=ingested_at_utc)
-        log.info("Topic created: chat_id=%s thread_id=%s title=%r", chat_id, thread_id, title)
-
-    if isinstance(message.get("forum_topic_edited"), dict) and thread_id is not None:
-        title = message["forum_topic_edited"].get("name")
-        title = title if isinstance(title, str) else None
-        db.upsert_topic(chat_id=chat_id, thread_id=thread_id, title=title, now_utc_iso=ingested_at_utc)
-        log.info("Topic edited: chat_id=%s thread_id=%s title=%r", chat_id, thread_id, title)
+    if thread_id is not None and "forum_topic_created" in service_present:
+        created = message["forum_topic_created"]
+        if isinstance(created, dict):
+            title = created.get("name")
+            title = title if isinstance(title, str) else None
+            topics.append(
+                {"chat_id": chat_id, "thread_id": thread_id, "title": title, "now_utc_iso": ingested_at_utc}
+            )
+            log.info("Topic created: chat_id=%s thread_id=%s title=%r", chat_id, thread_id, title)
+
+    if thread_id is not None and "forum_topic_edited" in service_present:
+        edited = message["forum_topic_edited"]
+        if isinstance(edited, dict):
+            title = edited.get("name")
+            title = title if isinstance(title, str) else None
+            topics.append(
+                {"chat_id": chat_id, "thread_id": thread_id, "title": title, "now_utc_iso": ingested_at_utc}
+            )
+            log.info("Topic edited: chat_id=%s thread_id=%s title=%r", chat_id, thread_id, title)
+
+    return record, topics
+
+
+def ingest_updates(*, db: Database, config: Config, updates: list[dict[str, Any]]) -> int:
+    """
+    Ingest a getUpdates batch with one SQLite transaction; returns the number of messages stored.
+    """
+    ingested_at_utc = to_iso_utc(now_utc())
+    records: list[dict[str, Any]] = []
+    topics: list[dict[str, Any]] = []
+    for update in updates:
+        record, update_topics = _prepare_update(config=config, update=update, ingested_at_utc=ingested_at_utc)
+        if record is None:
+            continue
+        records.append(record)
+        topics.extend(update_topics)
+
+    if records:
+        db.upsert_ingest_batch(messages=records, topics=topics, ingested_at_utc=ingested_at_utc)
+    return len(records)
+
+
+def ingest_update(*, db: Database, config: Config, update: dict[str, Any]) -> None:
+    ingest_updates(db=db, config=config, updates=[update])
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import cached_property
 import logging
 from typing import Any
 
+import orjson
 import requests
 
 from src.llm.interface import ChatMessage
+from src.util.http import shared_session
 
 
 log = logging.getLogger(__name__)
@@ -19,16 +22,14 @@ class OpenRouterClient:
     base_url: str = "https://openrouter.ai/api/v1"
     site_url: str | None = None
     app_name: str | None = None
+    session: requests.Session = field(default_factory=shared_session, repr=False, compare=False)
 
-    def chat(
-        self,
-        *,
-        messages: list[ChatMessage],
-        temperature: float,
-        max_tokens: int,
-        timeout_seconds: int,
-    ) -> str:
-        url = f"{self.base_url.rstrip('/')}/chat/completions"
+    @cached_property
+    def _url(self) -> str:
+        return f"{self.base_url.rstrip('/')}/chat/completions"
+
+    @cached_property
+    def _headers(self) -> dict[str, str]:
         headers: dict[str, str] = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -37,7 +38,16 @@ class OpenRouterClient:
             headers["HTTP-Referer"] = self.site_url
         if self.app_name:
             headers["X-Title"] = self.app_name
+        return headers
 
+    def chat(
+        self,
+        *,
+        messages: list[ChatMessage],
+        temperature: float,
+        max_tokens: int,
+        timeout_seconds: int,
+    ) -> str:
         payload: dict[str, Any] = {
             "model": self.model,
             "messages": [{"role": m.role, "content": m.content} for m in messages],
@@ -45,20 +55,24 @@ class OpenRouterClient:
             "max_tokens": int(max_tokens),
         }
 
-        resp = requests.post(url, json=payload, headers=headers, timeout=timeout_seconds)
+        resp = self.session.post(
+            self._url, data=orjson.dumps(payload), headers=self._headers, timeout=timeout_seconds
+        )
+        status = resp.status_code
         try:
-            data = resp.json()
+            data = orjson.loads(resp.content)
         except ValueError:
-            resp.raise_for_status()
-            raise RuntimeError(f"OpenRouter chat failed: HTTP {resp.status_code} (non-JSON response)")
+            if status >= 400:
+                resp.raise_for_status()
+            raise RuntimeError(f"OpenRouter chat failed: HTTP {status} (non-JSON response)") from None
 
-        if not resp.ok:
+        if status >= 400:
             err = data.get("error") if isinstance(data, dict) else None
             msg = None
             if isinstance(err, dict):
                 msg = err.get("message")
             raise RuntimeError(
-                f"OpenRouter chat failed: HTTP {resp.status_code}"
+                f"OpenRouter chat failed: HTTP {status}"
                 + (f", {msg}" if isinstance(msg, str) and msg.strip() else "")
             )
 
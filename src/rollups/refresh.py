@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 import logging
 
 from src.config import Config
 from src.db import Database
 from src.llm.factory import create_llm_client
-from src.rollups.service import update_topic_rollup
+from src.rollups.service import (
+    RollupPlan,
+    plan_topic_rollup,
+    save_topic_rollup,
+    summarize_topic_rollup,
+)
 from src.util.time import now_utc, to_iso_utc
 
 
@@ -61,19 +67,44 @@ def maybe_refresh_rollups_before_digest(
         db.set_state("last_rollup_refresh_at_utc", now_iso)
         return
 
+    # Plans (DB reads) and saves (DB writes) stay on this thread, which owns the SQLite
+    # connection; only the independent, network-bound LLM calls run in parallel.
+    thread_ids = [int(row["thread_id"]) if row["thread_id"] is not None else None for row in activity]
+    titles = db.get_topic_titles(
+        chat_id=config.source_chat_id, thread_ids=[tid for tid in thread_ids if tid is not None]
+    )
+    rollups = db.get_topic_rollups(chat_id=config.source_chat_id, thread_ids=thread_ids)
+
     attempted = 0
     updated = 0
-    for row in activity:
-        thread_id = int(row["thread_id"]) if row["thread_id"] is not None else None
+    plans: list[RollupPlan] = []
+    for thread_id in thread_ids:
         attempted += 1
         try:
-            res = update_topic_rollup(db=db, config=config, llm=llm, thread_id=thread_id, mode=None)
+            plan = plan_topic_rollup(
+                db=db, config=config, thread_id=thread_id, mode=None, titles=titles, rollups=rollups
+            )
         except Exception:
             log.exception("Rollup refresh failed for thread_id=%s", thread_id)
             continue
-        if res.updated:
-            updated += 1
+        if isinstance(plan, RollupPlan):
+            plans.append(plan)
+
+    if plans:
+        workers = max(1, min(config.rollup_refresh_concurrency, len(plans)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(summarize_topic_rollup, config=config, llm=llm, plan=plan): plan
+                for plan in plans
+            }
+            for future in as_completed(futures):
+                plan = futures[future]
+                try:
+                    save_topic_rollup(db=db, config=config, plan=plan, summary=future.result())
+                except Exception:
+                    log.exception("Rollup refresh failed for thread_id=%s", plan.thread_id)
+                    continue
+                updated += 1
 
     db.set_state("last_rollup_refresh_at_utc", now_iso)
     log.info("Rollup refresh done (updated=%s attempted=%s)", updated, attempted)
-
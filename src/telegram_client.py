@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import cached_property, lru_cache
 import logging
 from typing import Any
 
+import orjson
 import requests
 import json
 
+from src.util.http import shared_session
 from src.util.telegram_format import SendResult, chunk_text
 
 
@@ -15,37 +18,57 @@ log = logging.getLogger(__name__)
 ReplyMarkup = dict[str, Any]
 
 
+@lru_cache(maxsize=8)
+def _encode_allowed(update_types: tuple[str, ...]) -> str:
+    return json.dumps(list(update_types))
+
+
 @dataclass(frozen=True)
 class TelegramClient:
     token: str
+    session: requests.Session = field(default_factory=shared_session, repr=False, compare=False)
 
-    @property
+    @cached_property
     def base_url(self) -> str:
         return f"https://api.telegram.org/bot{self.token}"
 
+    # Hot-path endpoints: getUpdates runs every poll, sendMessage once per chunk.
+    @cached_property
+    def _get_updates_url(self) -> str:
+        return f"{self.base_url}/getUpdates"
+
+    @cached_property
+    def _send_message_url(self) -> str:
+        return f"{self.base_url}/sendMessage"
+
     def get_updates(
         self,
         *,
         offset: int | None,
         timeout_seconds: int,
-        allowed_updates: list[str] | None = None,
+        allowed_updates: list[str] | str | None = None,
         limit: int = 100,
     ) -> list[dict[str, Any]]:
+        """
+        Long-poll for updates. `allowed_updates` may be a list or an already JSON-encoded string.
+        """
         params: dict[str, Any] = {"timeout": timeout_seconds, "limit": limit}
         if offset is not None:
             params["offset"] = offset
         if allowed_updates is not None:
-            params["allowed_updates"] = json.dumps(allowed_updates)
+            params["allowed_updates"] = (
+                allowed_updates if isinstance(allowed_updates, str) else _encode_allowed(tuple(allowed_updates))
+            )
 
-        resp = requests.get(f"{self.base_url}/getUpdates", params=params, timeout=timeout_seconds + 10)
+        resp = self.session.get(self._get_updates_url, params=params, timeout=timeout_seconds + 10)
         resp.raise_for_status()
-        payload = resp.json()
+        payload = orjson.loads(resp.content)
         if not payload.get("ok"):
             raise RuntimeError(f"getUpdates failed: {payload!r}")
         return payload.get("result", [])
 
     def get_chat(self, *, chat_id: int | str) -> dict[str, Any]:
-        resp = requests.get(f"{self.base_url}/getChat", params={"chat_id": chat_id}, timeout=30)
+        resp = self.session.get(f"{self.base_url}/getChat", params={"chat_id": chat_id}, timeout=30)
         resp.raise_for_status()
         payload = resp.json()
         if not payload.get("ok"):
@@ -66,32 +89,34 @@ class TelegramClient:
         reply_markup: ReplyMarkup | None = None,
     ) -> SendResult:
         message_ids: list[int] = []
-        chunks = chunk_text(text)
-        for idx, chunk in enumerate(chunks):
-            params: dict[str, Any] = {
-                "chat_id": chat_id,
-                "text": chunk,
-                "disable_web_page_preview": disable_web_page_preview,
-            }
-            if message_thread_id is not None:
-                params["message_thread_id"] = message_thread_id
-            if parse_mode is not None:
-                params["parse_mode"] = parse_mode
+        base_params: dict[str, Any] = {
+            "chat_id": chat_id,
+            "disable_web_page_preview": disable_web_page_preview,
+        }
+        if message_thread_id is not None:
+            base_params["message_thread_id"] = message_thread_id
+        if parse_mode is not None:
+            base_params["parse_mode"] = parse_mode
+
+        # Chunks are sent one after another on purpose: Telegram shows messages in arrival
+        # order, so concurrent sends could shuffle the pieces of a long digest.
+        for idx, chunk in enumerate(chunk_text(text)):
+            params = {**base_params, "text": chunk}
             if reply_markup is not None and idx == 0:
                 params["reply_markup"] = json.dumps(reply_markup)
 
-            resp = requests.post(f"{self.base_url}/sendMessage", data=params, timeout=30)
+            resp = self.session.post(self._send_message_url, data=params, timeout=30)
+            status = resp.status_code
             try:
-                payload = resp.json()
+                payload = orjson.loads(resp.content)
             except ValueError:
-                resp.raise_for_status()
-                raise RuntimeError(f"sendMessage failed: HTTP {resp.status_code} (non-JSON response)")
+                if status >= 400:
+                    resp.raise_for_status()
+                raise RuntimeError(f"sendMessage failed: HTTP {status} (non-JSON response)") from None
 
-            if not resp.ok or not payload.get("ok"):
+            if status >= 400 or not payload.get("ok"):
                 description = payload.get("description")
-                raise RuntimeError(
-                    f"sendMessage failed: HTTP {resp.status_code}, {description or payload!r}"
-                )
+                raise RuntimeError(f"sendMessage failed: HTTP {status}, {description or payload!r}")
 
             message_ids.append(int(payload["result"]["message_id"]))
         return SendResult(message_ids=message_ids)
@@ -135,7 +160,7 @@ class TelegramClient:
         if reply_markup is not None:
             params["reply_markup"] = json.dumps(reply_markup)
 
-        resp = requests.post(f"{self.base_url}/editMessageText", data=params, timeout=30)
+        resp = self.session.post(f"{self.base_url}/editMessageText", data=params, timeout=30)
         try:
             payload = resp.json()
         except ValueError:
@@ -162,7 +187,7 @@ class TelegramClient:
         if reply_markup is not None:
             params["reply_markup"] = json.dumps(reply_markup)
 
-        resp = requests.post(f"{self.base_url}/editMessageReplyMarkup", data=params, timeout=30)
+        resp = self.session.post(f"{self.base_url}/editMessageReplyMarkup", data=params, timeout=30)
         try:
             payload = resp.json()
         except ValueError:
@@ -191,7 +216,7 @@ class TelegramClient:
         if text is not None:
             params["text"] = text
 
-        resp = requests.post(f"{self.base_url}/answerCallbackQuery", data=params, timeout=30)
+        resp = self.session.post(f"{self.base_url}/answerCallbackQuery", data=params, timeout=30)
         try:
             payload = resp.json()
         except ValueError:
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+@lru_cache(maxsize=None)
+def shared_session() -> requests.Session:
+    """
+    Process-wide keep-alive session, so repeated API calls reuse pooled TLS connections.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -6,7 +6,7 @@ from dataclasses import dataclass
 TELEGRAM_MAX_MESSAGE_CHARS = 4096
 
 
-_ORPHAN_HEADERS = {
+_ORPHAN_HEADERS = frozenset({
     "Summary",
     "Summary:",
     "Top threads",
@@ -17,7 +17,7 @@ _ORPHAN_HEADERS = {
     "Quotes:",
     "Answer",
     "Receipts",
-}
+})
 
 
 def _avoid_orphan_header_cut(chunk: str) -> int | None:
@@ -31,48 +31,47 @@ def _avoid_orphan_header_cut(chunk: str) -> int | None:
     if not stripped:
         return None
 
-    lines = stripped.splitlines()
-    while lines and not lines[-1].strip():
-        lines.pop()
-    if not lines:
-        return None
-
-    last = lines[-1].strip()
+    idx = stripped.rfind("\n")
+    last = stripped[idx + 1 :].strip()
     if last not in _ORPHAN_HEADERS and not last.startswith("Topic: "):
         return None
 
-    prefix = "\n".join(lines[:-1])
-    new_cut = len(prefix)
-    return new_cut if new_cut > 0 else None
+    return idx if idx > 0 else None
 
 
 def chunk_text(text: str, *, limit: int = TELEGRAM_MAX_MESSAGE_CHARS) -> list[str]:
-    if len(text) <= limit:
+    n = len(text)
+    if n <= limit:
         return [text]
 
+    # Walk the text by index so each chunk is sliced once, instead of re-copying the
+    # shrinking remainder after every cut.
     chunks: list[str] = []
-    remaining = text
-    while remaining:
-        if len(remaining) <= limit:
-            chunks.append(remaining)
+    start = 0
+    while start < n:
+        if n - start <= limit:
+            chunks.append(text[start:])
             break
 
         # Prefer splitting on high-level section boundaries so related content
         # (e.g., a whole "Topic: ..." block) stays in the same Telegram message.
-        cut = remaining.rfind("\n\nTopic:", 0, limit)
-        if cut <= 0:
-            cut = remaining.rfind("\n\n", 0, limit)
-        if cut <= 0:
-            cut = remaining.rfind("\n", 0, limit)
-        if cut <= 0:
-            cut = limit
-
-        cut_override = _avoid_orphan_header_cut(remaining[:cut])
+        end = start + limit
+        cut = text.rfind("\n\nTopic:", start, end)
+        if cut <= start:
+            cut = text.rfind("\n\n", start, end)
+        if cut <= start:
+            cut = text.rfind("\n", start, end)
+        if cut <= start:
+            cut = end
+
+        cut_override = _avoid_orphan_header_cut(text[start:cut])
         if cut_override is not None and cut_override > 0:
-            cut = cut_override
+            cut = start + cut_override
 
-        chunks.append(remaining[:cut].rstrip())
-        remaining = remaining[cut:].lstrip("\n")
+        chunks.append(text[start:cut].rstrip())
+        start = cut
+        while start < n and text[start] == "\n":
+            start += 1
     return [c for c in chunks if c]
 
 
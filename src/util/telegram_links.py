@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from functools import lru_cache
+
 
 def _internal_chat_id_for_tme(chat_id: int) -> int | None:
     """
@@ -13,6 +15,33 @@ def _internal_chat_id_for_tme(chat_id: int) -> int | None:
     return chat_id_abs if chat_id_abs > 0 else None
 
 
+@lru_cache(maxsize=1024)
+def build_message_link_prefix(
+    *,
+    chat_id: int,
+    thread_id: int | None,
+    username: str | None,
+) -> str | None:
+    """
+    Everything in a message permalink except the trailing message id.
+
+    Lets callers linking many messages from one topic build the constant part once. Memoized,
+    since a chat only has a handful of (thread, username) combinations.
+    """
+    thread_part = None if thread_id in (None, 1) else int(thread_id)
+    if username:
+        if thread_part is not None:
+            return f"https://t.me/{username}/{thread_part}/"
+        return f"https://t.me/{username}/"
+
+    internal_id = _internal_chat_id_for_tme(chat_id)
+    if internal_id is None:
+        return None
+    if thread_part is not None:
+        return f"https://t.me/c/{internal_id}/{thread_part}/"
+    return f"https://t.me/c/{internal_id}/"
+
+
 def build_message_link(
     *,
     chat_id: int,
@@ -31,16 +60,7 @@ def build_message_link(
       - https://t.me/c/<internal_id>/<message_id>
       - https://t.me/c/<internal_id>/<thread_id>/<message_id>
     """
-    thread_part = None if thread_id in (None, 1) else int(thread_id)
-    if username:
-        if thread_part is not None:
-            return f"https://t.me/{username}/{thread_part}/{int(message_id)}"
-        return f"https://t.me/{username}/{int(message_id)}"
-
-    internal_id = _internal_chat_id_for_tme(chat_id)
-    if internal_id is None:
+    prefix = build_message_link_prefix(chat_id=chat_id, thread_id=thread_id, username=username)
+    if prefix is None:
         return None
-    if thread_part is not None:
-        return f"https://t.me/c/{internal_id}/{thread_part}/{int(message_id)}"
-    return f"https://t.me/c/{internal_id}/{int(message_id)}"
-
+    return f"{prefix}{int(message_id)}"
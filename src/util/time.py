@@ -2,7 +2,9 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 import re
+import time
 from zoneinfo import ZoneInfo
 
 
@@ -10,6 +12,7 @@ UTC = timezone.utc
 
 
 _DURATION_RE = re.compile(r"^\s*(\d+)\s*([smhdw])\s*$", re.IGNORECASE)
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
 
 
 def now_utc() -> datetime:
@@ -19,9 +22,25 @@ def now_utc() -> datetime:
 def to_iso_utc(dt: datetime) -> str:
     if dt.tzinfo is None:
         raise ValueError("datetime must be timezone-aware")
-    return dt.astimezone(UTC).replace(microsecond=0).isoformat()
+    return dt.astimezone(UTC).isoformat(timespec="seconds")
 
 
+def unix_to_iso_utc(ts: int) -> str:
+    """
+    Format unix seconds like to_iso_utc(), without building a datetime.
+    """
+    t = time.gmtime(int(ts))
+    return "%04d-%02d-%02dT%02d:%02d:%02d+00:00" % (
+        t.tm_year,
+        t.tm_mon,
+        t.tm_mday,
+        t.tm_hour,
+        t.tm_min,
+        t.tm_sec,
+    )
+
+
+@lru_cache(maxsize=64)
 def parse_duration(value: str) -> timedelta:
     """
     Parse simple durations like: 30m, 6h, 2d, 1w.
@@ -29,19 +48,7 @@ def parse_duration(value: str) -> timedelta:
     match = _DURATION_RE.match(value)
     if not match:
         raise ValueError(f"Invalid duration: {value!r} (expected e.g. 6h, 2d)")
-    amount = int(match.group(1))
-    unit = match.group(2).lower()
-    if unit == "s":
-        return timedelta(seconds=amount)
-    if unit == "m":
-        return timedelta(minutes=amount)
-    if unit == "h":
-        return timedelta(hours=amount)
-    if unit == "d":
-        return timedelta(days=amount)
-    if unit == "w":
-        return timedelta(weeks=amount)
-    raise ValueError(f"Unsupported duration unit: {unit!r}")
+    return timedelta(seconds=int(match.group(1)) * _UNIT_SECONDS[match.group(2).lower()])
 
 
 @dataclass(frozen=True)
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+import pytest
+
+from src.commands.router import CommandContext
+from src.config import Config
+from src.db import Database
+
+
+_FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+_ROUTER_CONFIG = Config(telegram_bot_token="t", source_chat_id=-1001, control_chat_ids=frozenset({123}))
+
+_MESSAGE_DEFAULTS: dict[str, Any] = {
+    "thread_id": None,
+    "from_id": 1,
+    "from_username": "alice",
+    "from_display": "Alice",
+    "text": None,
+    "raw_json": "{}",
+    "reply_to_message_id": None,
+    "is_service": 0,
+    "edit_date_utc": None,
+}
+
+
+@pytest.fixture(scope="session")
+def schema_template() -> Iterator[Database]:
+    """
+    An in-memory database with the schema applied once per test session.
+    """
+    db = Database(":memory:", fast_bulk=True)
+    db.init_schema()
+    yield db
+    db.close()
+
+
+@pytest.fixture(scope="session")
+def export_sample_payload() -> dict[str, Any]:
+    """
+    The parsed Telegram export fixture, loaded once. import_export_json only reads it; don't mutate.
+    """
+    return json.loads((_FIXTURES_DIR / "export_sample.json").read_bytes())
+
+
+@pytest.fixture
+def db(schema_template: Database) -> Iterator[Database]:
+    """
+    A fresh in-memory database per test, cloned from the template with SQLite's backup API
+    rather than re-running the schema DDL.
+    """
+    fresh = Database(":memory:", fast_bulk=True)
+    schema_template.conn.backup(fresh.conn)
+    yield fresh
+    fresh.close()
+
+
+@pytest.fixture
+def insert_messages(db: Database) -> Callable[[Iterable[dict[str, Any]]], None]:
+    """
+    Insert message rows in one executemany transaction. Each row needs chat_id, message_id and
+    date_utc; the other columns default to an ordinary text message from "Alice", ingested at
+    its own date.
+    """
+
+    def _insert(rows: Iterable[dict[str, Any]]) -> None:
+        db.upsert_messages_bulk(
+            [{**_MESSAGE_DEFAULTS, "ingested_at_utc": row["date_utc"], **row} for row in rows]
+        )
+
+    return _insert
+
+
+@pytest.fixture(scope="module")
+def router_ctx(schema_template: Database) -> Iterator[CommandContext]:
+    """
+    A command context shared by a module's router parsing tests. Those commands only parse the
+    message text, so one read-only clone of the template (PRAGMA query_only) serves them all; an
+    accidental write fails loudly instead of leaking into later tests.
+    """
+    shared = Database(":memory:", fast_bulk=True)
+    schema_template.conn.backup(shared.conn)
+    shared.conn.execute("PRAGMA query_only=ON;")
+    yield CommandContext(config=_ROUTER_CONFIG, db=shared)
+    shared.close()
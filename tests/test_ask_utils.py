@@ -1,12 +1,14 @@
 from __future__ import annotations
 
 from datetime import timedelta
+import re
 
 from src.commands.ask import (
     _build_fts_query,
     _extract_citations,
     _extract_query_tokens,
     _is_broad_question,
+    _one_line,
     _parse_ask_args,
     _score_message,
 )
@@ -35,6 +37,13 @@ def test_extract_citations() -> None:
     assert _extract_citations(text, max_evidence=5) == [1, 3]
 
 
+def test_extract_citations_only_counts_standalone_ids() -> None:
+    text = "Citations: E1, xE2, e4. E1234, E5a, E3_, (E3), E1\nnot this line E2"
+    assert _extract_citations(text, max_evidence=9) == [1, 4, 3]
+    assert _extract_citations("Citations: E2, e1, E2", max_evidence=9) == [2, 1]
+    assert _extract_citations("no citations here", max_evidence=9) == []
+
+
 def test_is_broad_question_tldr() -> None:
     q = "give me the tldr on the last 24h"
     tokens = _extract_query_tokens(q)
@@ -45,3 +54,16 @@ def test_score_message_prefers_github_pr_over_logs() -> None:
     log_text = "2025-12-15T11:17:30.495514Z  INFO [[Instance 1]] Processed 83 blocks and 83 headers in 10.00s"
     pr_text = "PR #784 is up for review https://github.com/kaspanet/rusty-kaspa/pull/784"
     assert _score_message(pr_text) > _score_message(log_text)
+
+
+def test_ask_helpers_only_use_precompiled_patterns(monkeypatch) -> None:
+    def _no_adhoc_regex(*args: object, **kwargs: object) -> None:
+        raise AssertionError("ask helpers should use module-level compiled patterns")
+
+    for name in ("compile", "sub", "subn", "findall", "finditer", "search", "match", "fullmatch", "split"):
+        monkeypatch.setattr(re, name, _no_adhoc_regex)
+
+    assert _parse_ask_args("6h x") == (timedelta(hours=6), False, "x")
+    assert _build_fts_query("What is the stratum bridge?") == "stratum OR bridge"
+    assert _extract_citations("Citations: e2", max_evidence=3) == [2]
+    assert _one_line(" a\n b ") == "a b"
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+from src.config import Config
+from src.db import Database
+import src.digest.build_digest as build_digest_module
+from src.digest.build_digest import DigestBuilder, build_digest, build_extractive_digest
+
+
+def _insert_message(
+    db: Database,
+    *,
+    chat_id: int,
+    message_id: int,
+    thread_id: int | None,
+    date_utc: str,
+    text: str,
+) -> None:
+    db.upsert_message(
+        {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "thread_id": thread_id,
+            "date_utc": date_utc,
+            "from_id": 1,
+            "from_username": "alice",
+            "from_display": "Alice",
+            "text": text,
+            "raw_json": "{}",
+            "reply_to_message_id": None,
+            "is_service": 0,
+            "edit_date_utc": None,
+            "ingested_at_utc": date_utc,
+        }
+    )
+
+
+def _seed(db: Database, config: Config) -> None:
+    db.upsert_topic(
+        chat_id=config.source_chat_id,
+        thread_id=101,
+        title="Rust stratum bridge",
+        now_utc_iso="2025-01-01T00:00:00+00:00",
+    )
+    _insert_message(
+        db,
+        chat_id=config.source_chat_id,
+        message_id=10,
+        thread_id=101,
+        date_utc="2025-01-01T01:00:00+00:00",
+        text="PR merged, see https://github.com/kaspanet/rusty-kaspa/pull/1",
+    )
+    _insert_message(
+        db,
+        chat_id=config.source_chat_id,
+        message_id=11,
+        thread_id=101,
+        date_utc="2025-01-01T01:05:00+00:00",
+        text="thanks!",
+    )
+
+
+class _FailingLLM:
+    def chat(self, **kwargs: object) -> str:
+        raise RuntimeError("boom")
+
+
+class _CannedLLM:
+    def chat(self, **kwargs: object) -> str:
+        return (
+            "### OVERALL\n"
+            "- Bridge PR merged\n"
+            "\n"
+            "### TOP_THREADS\n"
+            "T1: Rust stratum bridge — PR merged\n"
+            "\n"
+            "### TOPIC T1\n"
+            "\n"
+            "Summary:\n"
+            "- PR merged\n"
+            "\n"
+        )
+
+
+def test_extractive_digest_includes_links_and_quotes(db: Database) -> None:
+    config = Config(telegram_bot_token="t", source_chat_id=-1001, control_chat_ids=frozenset({123}))
+    _seed(db, config)
+
+    out = build_extractive_digest(
+        db=db,
+        config=config,
+        window_start_utc="2025-01-01T00:00:00+00:00",
+        window_end_utc="2025-01-02T00:00:00+00:00",
+    )
+
+    assert "- Rust stratum bridge (2 msgs)" in out
+    assert "Topic: Rust stratum bridge (2 msgs)" in out
+    assert "- https://github.com/kaspanet/rusty-kaspa/pull/1" in out
+    assert "Alice: thanks! — https://t.me/c/1001/101/11" in out
+
+
+def test_digest_llm_failure_falls_back_to_extractive(db: Database, monkeypatch) -> None:
+    config = Config(
+        telegram_bot_token="t",
+        source_chat_id=-1001,
+        control_chat_ids=frozenset({123}),
+        llm_provider="openrouter",
+    )
+    _seed(db, config)
+    monkeypatch.setattr(build_digest_module, "create_llm_client", lambda config: _FailingLLM())
+
+    kwargs = {
+        "db": db,
+        "config": config,
+        "window_start_utc": "2025-01-01T00:00:00+00:00",
+        "window_end_utc": "2025-01-02T00:00:00+00:00",
+    }
+    assert build_digest(**kwargs) == build_extractive_digest(**kwargs)
+
+
+def test_digest_layers_llm_sections_over_receipts(db: Database, monkeypatch) -> None:
+    config = Config(
+        telegram_bot_token="t",
+        source_chat_id=-1001,
+        control_chat_ids=frozenset({123}),
+        llm_provider="openrouter",
+    )
+    _seed(db, config)
+    monkeypatch.setattr(build_digest_module, "create_llm_client", lambda config: _CannedLLM())
+
+    out = build_digest(
+        db=db,
+        config=config,
+        window_start_utc="2025-01-01T00:00:00+00:00",
+        window_end_utc="2025-01-02T00:00:00+00:00",
+    )
+
+    assert "Summary\n- Bridge PR merged\n" in out
+    assert "- Rust stratum bridge (2 msgs) — PR merged" in out
+    assert "Topic: Rust stratum bridge (2 msgs)\nSummary:\n- PR merged\nLinks:\n" in out
+    assert "Alice: thanks! — https://t.me/c/1001/101/11" in out
+
+
+def test_one_line_collapses_whitespace() -> None:
+    assert build_digest_module._one_line("  a\tb\r\n\r\nc   d  ") == "a b c d"
+    # Unicode whitespace (NBSP, em space, line separator) collapses too.
+    assert build_digest_module._one_line("a\u00a0b\u2003c\u2028d") == "a b c d"
+    assert build_digest_module._one_line(" \t\n ") == ""
+
+
+def test_digest_builder_reuses_llm_client_across_windows(db: Database, monkeypatch) -> None:
+    config = Config(
+        telegram_bot_token="t",
+        source_chat_id=-1001,
+        control_chat_ids=frozenset({123}),
+        llm_provider="openrouter",
+    )
+    _seed(db, config)
+    created: list[object] = []
+
+    def _create(config: Config) -> _CannedLLM:
+        created.append(config)
+        return _CannedLLM()
+
+    monkeypatch.setattr(build_digest_module, "create_llm_client", _create)
+
+    builder = DigestBuilder(config)
+    for day in ("01", "02"):
+        builder.build(
+            db=db,
+            window_start_utc=f"2025-01-{day}T00:00:00+00:00",
+            window_end_utc=f"2025-01-{day}T23:59:59+00:00",
+        )
+
+    assert len(created) == 1
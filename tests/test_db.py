@@ -6,10 +6,7 @@ import pytest
 from src.db import Database
 
 
-def test_search_fts5_best_effort() -> None:
-    db = Database(":memory:")
-    db.init_schema()
-
+def test_search_fts5_best_effort(db: Database) -> None:
     db.upsert_message(
         {
             "chat_id": 1,
@@ -37,10 +34,39 @@ def test_search_fts5_best_effort() -> None:
     assert hits[0].message_id == 1
 
 
-def test_backfill_topic_titles_from_raw_json() -> None:
-    db = Database(":memory:")
-    db.init_schema()
+def test_search_filters_chat_and_window_across_many_matches(db: Database, insert_messages) -> None:
+    # ~1000 matching messages per chat; only chat 2's in-window hits may come back.
+    insert_messages(
+        {
+            "chat_id": chat_id,
+            "message_id": i,
+            "date_utc": f"2025-01-{1 + i % 28:02d}T00:00:00+00:00",
+            "text": "bridge " * (1 + i % 3) + f"note {i}",
+        }
+        for chat_id in (1, 2)
+        for i in range(1000)
+    )
+
+    try:
+        hits = db.search_messages(
+            chat_id=2,
+            query="bridge",
+            limit=20,
+            window_start_utc="2025-01-10T00:00:00+00:00",
+            window_end_utc="2025-01-12T00:00:00+00:00",
+        )
+    except RuntimeError:
+        pytest.skip("FTS5 not available in this SQLite build")
+
+    assert len(hits) == 20
+    assert all(h.chat_id == 2 for h in hits)
+    assert all("2025-01-10" <= h.date_utc[:10] <= "2025-01-12" for h in hits)
+    # bm25 ranks the messages repeating "bridge" three times first.
+    assert all(h.text.startswith("bridge bridge bridge ") for h in hits)
+    assert all(h.snippet and "[bridge]" in h.snippet for h in hits)
+
 
+def test_backfill_topic_titles_from_raw_json(db: Database) -> None:
     update = {
         "update_id": 1,
         "message": {
@@ -86,9 +112,165 @@ def test_backfill_topic_titles_from_raw_json() -> None:
     )
     assert updated == 1
 
-    row = db.conn.execute(
-        "SELECT title FROM topics WHERE chat_id = ? AND thread_id = ?;",
-        (-1001, 7562),
-    ).fetchone()
-    assert row is not None
-    assert row["title"] == "Covenants++"
+    assert db.get_topic_titles(chat_id=-1001, thread_ids=[7562]) == {7562: "Covenants++"}
+
+
+def test_backfill_topic_titles_handles_edited_bare_and_malformed_payloads(
+    db: Database, insert_messages
+) -> None:
+    payloads = {
+        1: {
+            "update_id": 2,
+            "edited_message": {"message_thread_id": 8, "forum_topic_edited": {"name": " Renamed "}},
+        },
+        2: {"message_thread_id": 9, "forum_topic_created": {"name": "Bare object"}},
+        3: '{"message": {"forum_topic_created": ',
+        4: {"update_id": 3, "message": "forum_topic_created", "edited_message": {"forum_topic_created": {}}},
+    }
+    insert_messages(
+        [
+            {
+                "chat_id": -1001,
+                "message_id": message_id,
+                "thread_id": 10 + message_id,
+                "date_utc": f"2025-01-01T00:0{message_id}:00+00:00",
+                "raw_json": payload if isinstance(payload, str) else json.dumps(payload),
+            }
+            for message_id, payload in payloads.items()
+        ]
+    )
+
+    updated = db.backfill_topic_titles_from_raw_json(
+        chat_id=-1001, thread_ids=None, limit=50, now_utc_iso="2025-01-01T00:10:00+00:00"
+    )
+
+    assert updated == 2
+    titles = dict(db.conn.execute("SELECT thread_id, title FROM topics ORDER BY thread_id;").fetchall())
+    assert titles == {8: "Renamed", 9: "Bare object"}
+
+
+def test_get_messages_for_topics_matches_per_topic_query(db: Database) -> None:
+    message_id = 0
+    for thread_id in (None, 7, 8):
+        for minute in range(5):
+            message_id += 1
+            db.upsert_message(
+                {
+                    "chat_id": 1,
+                    "message_id": message_id,
+                    "thread_id": thread_id,
+                    "date_utc": f"2025-01-01T00:0{minute}:00+00:00",
+                    "from_id": 1,
+                    "from_username": "alice",
+                    "from_display": "Alice",
+                    "text": f"msg {message_id}",
+                    "raw_json": "{}",
+                    "reply_to_message_id": None,
+                    "is_service": 0,
+                    "edit_date_utc": None,
+                    "ingested_at_utc": "2025-01-01T00:00:00+00:00",
+                }
+            )
+
+    window = {
+        "window_start_utc": "2025-01-01T00:01:00+00:00",
+        "window_end_utc": "2025-01-01T00:10:00+00:00",
+    }
+    batched = db.get_messages_for_topics(chat_id=1, thread_ids=[None, 7], limit_per_topic=3, **window)
+
+    assert set(batched) == {None, 7}
+    for thread_id in (None, 7):
+        single = db.get_messages_for_topic(chat_id=1, thread_id=thread_id, limit=3, **window)
+        assert [r["message_id"] for r in batched[thread_id]] == [r["message_id"] for r in single]
+        assert len(batched[thread_id]) == 3
+
+
+def test_upsert_messages_bulk_keeps_existing_fields_on_conflict(db: Database) -> None:
+    base = {
+        "chat_id": 1,
+        "thread_id": 5,
+        "date_utc": "2025-01-01T00:00:00+00:00",
+        "from_id": 1,
+        "from_username": "alice",
+        "from_display": "Alice",
+        "text": "hello",
+        "raw_json": "{}",
+        "reply_to_message_id": None,
+        "is_service": 0,
+        "edit_date_utc": None,
+        "ingested_at_utc": "2025-01-01T00:00:00+00:00",
+    }
+    db.upsert_messages_bulk([{**base, "message_id": 1}, {**base, "message_id": 2}])
+    db.upsert_messages_bulk([{**base, "message_id": 2, "thread_id": None, "text": None}])
+
+    rows = db.conn.execute(
+        "SELECT message_id, thread_id, text FROM messages WHERE chat_id = 1 ORDER BY message_id;"
+    ).fetchall()
+    assert [tuple(r) for r in rows] == [(1, 5, "hello"), (2, 5, "hello")]
+
+
+def test_file_database_uses_wal_and_tuned_pragmas(tmp_path) -> None:
+    db = Database(str(tmp_path / "bot.sqlite3"))
+
+    assert db.conn.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+    assert db.conn.execute("PRAGMA synchronous;").fetchone()[0] == 1  # NORMAL
+    assert db.conn.execute("PRAGMA cache_size;").fetchone()[0] == -20000
+    db.close()
+
+
+def test_fast_bulk_database_skips_wal_and_fsync(tmp_path) -> None:
+    db = Database(str(tmp_path / "bulk.sqlite3"), fast_bulk=True)
+
+    assert db.conn.execute("PRAGMA journal_mode;").fetchone()[0] == "memory"
+    assert db.conn.execute("PRAGMA synchronous;").fetchone()[0] == 0  # OFF
+    db.close()
+
+
+def test_window_stats_use_covering_chat_date_index(db: Database) -> None:
+    plan = db.conn.execute(
+        """
+        EXPLAIN QUERY PLAN
+        SELECT COUNT(*), COUNT(DISTINCT COALESCE(thread_id, -1))
+        FROM messages
+        WHERE chat_id = ? AND is_service = 0 AND date_utc >= ? AND date_utc <= ?;
+        """,
+        (-1001, "2025-01-01T00:00:00+00:00", "2025-01-02T00:00:00+00:00"),
+    ).fetchall()
+
+    assert any("COVERING INDEX idx_messages_chat_date" in str(row["detail"]) for row in plan)
+
+
+def test_init_schema_moves_fts_to_stemming_tokenizer(tmp_path) -> None:
+    path = str(tmp_path / "legacy.sqlite3")
+    db = Database(path, fast_bulk=True)
+    db.init_schema()
+    # Simulate a database created before the tokenizer change.
+    with db.conn:
+        db.conn.execute("DROP TABLE messages_fts;")
+        db.conn.execute(
+            "CREATE VIRTUAL TABLE messages_fts USING fts5(text, content='messages', content_rowid='id');"
+        )
+    db.upsert_message(
+        {
+            "chat_id": 1,
+            "message_id": 1,
+            "thread_id": None,
+            "date_utc": "2025-01-01T00:00:00+00:00",
+            "from_id": 1,
+            "from_username": "alice",
+            "from_display": "Alice",
+            "text": "Merging the café branch",
+            "raw_json": "{}",
+            "reply_to_message_id": None,
+            "is_service": 0,
+            "edit_date_utc": None,
+            "ingested_at_utc": "2025-01-01T00:00:00+00:00",
+        }
+    )
+    assert db.search_messages(chat_id=1, query="merged") == []
+
+    db.init_schema()
+
+    assert [hit.message_id for hit in db.search_messages(chat_id=1, query="merged")] == [1]
+    assert [hit.message_id for hit in db.search_messages(chat_id=1, query="cafe")] == [1]
+    db.close()
@@ -1,6 +1,11 @@
 from __future__ import annotations
 
-from src.digest.interactive import DigestCallback, encode_digest_callback, parse_digest_callback
+from src.digest.interactive import (
+    DigestCallback,
+    build_digest_topic_view_keyboard,
+    encode_digest_callback,
+    parse_digest_callback,
+)
 
 
 def test_callback_roundtrip_menu() -> None:
@@ -20,3 +25,33 @@ def test_callback_roundtrip_do_with_none_thread() -> None:
     assert cb.action == "teach"
     assert cb.thread_id is None
 
+
+
+def test_topic_view_keyboard_callbacks_match_encoder() -> None:
+    kb = build_digest_topic_view_keyboard(start_ts=1, end_ts=2, thread_id=7, view="teach")
+    datas = [button["callback_data"] for row in kb["inline_keyboard"] for button in row]
+    assert datas == [
+        encode_digest_callback(DigestCallback(1, 2, "do", "teach_detail", 7)),
+        encode_digest_callback(DigestCallback(1, 2, "do", "receipts", 7)),
+        encode_digest_callback(DigestCallback(1, 2, "do", "links", 7)),
+        encode_digest_callback(DigestCallback(1, 2, "menu", "teach")),
+        encode_digest_callback(DigestCallback(1, 2, "menu", "main")),
+    ]
+
+
+def test_parse_callback_rejects_malformed_data() -> None:
+    assert parse_digest_callback("dg|1|2|do|teach|7") == DigestCallback(1, 2, "do", "teach", 7)
+    assert parse_digest_callback("dg|1|2|do|teach") == DigestCallback(1, 2, "do", "teach", None)
+    assert parse_digest_callback("dg|1|2|menu") is None
+    assert parse_digest_callback("dg|x|2|menu|teach") is None
+    assert parse_digest_callback("dg|1|2|zz|teach") is None
+    assert parse_digest_callback("dg|1|2|do|teach|q") is None
+    assert parse_digest_callback("xx|1|2|menu|teach") is None
+
+
+def test_worst_case_callback_fits_telegram_limit() -> None:
+    # Telegram rejects callback_data longer than 64 bytes.
+    cb = DigestCallback(9_999_999_999, 9_999_999_999, "do", "teach_detail", 2**31 - 1)
+    data = encode_digest_callback(cb)
+    assert len(data.encode("utf-8")) <= 64
+    assert parse_digest_callback(data) == cb
@@ -1,21 +1,22 @@
 from __future__ import annotations
 
-import json
-from pathlib import Path
+from typing import Any
 
 from src.db import Database
-from src.ingest.importer import import_export_json
+from src.ingest.importer import (
+    _import_export_file,
+    _parse_export_from_id,
+    _resolve_export_thread_ids,
+    _scan_messages,
+    import_export_json,
+)
 
 
-def test_importer_inserts_and_normalizes(tmp_path: Path) -> None:
-    payload = json.loads((Path("tests/fixtures/export_sample.json")).read_text(encoding="utf-8"))
-    db = Database(str(tmp_path / "test.db"))
-    db.init_schema()
-
+def test_importer_inserts_and_normalizes(db: Database, export_sample_payload: dict[str, Any]) -> None:
     inserted, skipped = import_export_json(
         db=db,
         chat_id=-100123,
-        payload=payload,
+        payload=export_sample_payload,
         ingested_at_utc="2025-01-01T00:00:00+00:00",
         export_chat_name=None,
     )
@@ -23,26 +24,103 @@ def test_importer_inserts_and_normalizes(tmp_path: Path) -> None:
     assert inserted == 4
     assert skipped == 0
 
-    row = db.conn.execute(
-        "SELECT text, reply_to_message_id, thread_id FROM messages WHERE chat_id = ? AND message_id = ?;",
-        (-100123, 12),
-    ).fetchone()
-    assert row is not None
-    assert row["reply_to_message_id"] == 11
-    assert row["thread_id"] == 10
-    assert "hi there" in row["text"]
-    assert "https://example.com/path" in row["text"]
-
-    general = db.conn.execute(
-        "SELECT thread_id FROM messages WHERE chat_id = ? AND message_id = ?;",
-        (-100123, 13),
-    ).fetchone()
-    assert general is not None
-    assert general["thread_id"] == 1
-
-    topic = db.conn.execute(
-        "SELECT title FROM topics WHERE chat_id = ? AND thread_id = ?;",
-        (-100123, 10),
-    ).fetchone()
-    assert topic is not None
-    assert topic["title"] == "Topic A"
+    rows = db.conn.execute(
+        """
+        SELECT 'msg' AS src, message_id AS key, text, reply_to_message_id, thread_id, NULL AS title
+        FROM messages
+        WHERE chat_id = :chat_id AND message_id IN (12, 13)
+        UNION ALL
+        SELECT 'topic', thread_id, NULL, NULL, NULL, title
+        FROM topics
+        WHERE chat_id = :chat_id AND thread_id = 10;
+        """,
+        {"chat_id": -100123},
+    ).fetchall()
+    by_key = {(r["src"], r["key"]): r for r in rows}
+    assert set(by_key) == {("msg", 12), ("msg", 13), ("topic", 10)}
+
+    reply = by_key[("msg", 12)]
+    assert reply["reply_to_message_id"] == 11
+    assert reply["thread_id"] == 10
+    assert "hi there" in reply["text"]
+    assert "https://example.com/path" in reply["text"]
+
+    assert by_key[("msg", 13)]["thread_id"] == 1
+    assert by_key[("topic", 10)]["title"] == "Topic A"
+
+
+def test_importer_defer_fts_rebuilds_search_index(db: Database, export_sample_payload: dict[str, Any]) -> None:
+    inserted, _ = import_export_json(
+        db=db,
+        chat_id=-100123,
+        payload=export_sample_payload,
+        ingested_at_utc="2025-01-01T00:00:00+00:00",
+        defer_fts=True,
+    )
+    assert inserted == 4
+
+    hits = db.search_messages(chat_id=-100123, query="topic")
+    assert [hit.message_id for hit in hits] == [11]
+
+    # The sync triggers are back: a later insert is searchable without another rebuild.
+    db.upsert_message(
+        {
+            "chat_id": -100123,
+            "message_id": 14,
+            "thread_id": 1,
+            "date_utc": "2025-01-01T00:04:00+00:00",
+            "from_id": 1,
+            "from_username": None,
+            "from_display": "Dana",
+            "text": "late arrival",
+            "raw_json": "{}",
+            "reply_to_message_id": None,
+            "is_service": 0,
+            "edit_date_utc": None,
+            "ingested_at_utc": "2025-01-01T00:04:00+00:00",
+        }
+    )
+    assert [hit.message_id for hit in db.search_messages(chat_id=-100123, query="arrival")] == [14]
+
+
+def test_import_export_file_reads_path(db: Database) -> None:
+    inserted, skipped = _import_export_file(
+        db=db,
+        chat_id=-100123,
+        path="tests/fixtures/export_sample.json",
+        ingested_at_utc="2025-01-01T00:00:00+00:00",
+        export_chat_name=None,
+    )
+
+    assert (inserted, skipped) == (4, 0)
+    assert db.get_message_count(chat_id=-100123) == 4
+
+
+def test_resolve_export_thread_ids_follows_chains_and_breaks_cycles() -> None:
+    messages = [
+        {"id": 10},
+        {"id": 11, "reply_to_message_id": 10},
+        {"id": 12, "reply_to_message_id": 11},
+        {"id": 20, "reply_to_message_id": 21},
+        {"id": 21, "reply_to_message_id": 20},
+        {"id": 30, "reply_to_message_id": 999},
+    ]
+
+    _, _, reply_to = _scan_messages(messages)
+    resolved = _resolve_export_thread_ids(
+        messages=messages, reply_to=reply_to, topic_roots={10: "Topic A"}, assume_general_thread=True
+    )
+
+    assert resolved == {10: 10, 11: 10, 12: 10, 20: 1, 21: 1, 30: 1}
+
+
+def test_parse_export_from_id_prefixes() -> None:
+    assert _parse_export_from_id("user111") == 111
+    assert _parse_export_from_id(" channel42 ") == 42
+    assert _parse_export_from_id("chat7") == 7
+    assert _parse_export_from_id("12") == 12
+    assert _parse_export_from_id(5) == 5
+    assert _parse_export_from_id("user") is None
+    assert _parse_export_from_id("users12") is None
+    assert _parse_export_from_id("bot12") is None
+    assert _parse_export_from_id(None) is None
@@ -1,20 +1,18 @@
 from __future__ import annotations
 
+import json
+
+import orjson
+
 from src.config import Config
 from src.db import Database
-from src.ingest.listener import ingest_update
+from src.ingest.listener import ingest_update, ingest_updates
 
 
-def test_listener_ingests_message_and_topic() -> None:
-    db = Database(":memory:")
-    db.init_schema()
+_TEST_CONFIG = Config(telegram_bot_token="TEST", source_chat_id=-1001, control_chat_ids=frozenset({-2002}))
 
-    config = Config(
-        telegram_bot_token="TEST",
-        source_chat_id=-1001,
-        control_chat_ids={-2002},
-    )
 
+def test_listener_ingests_message_and_topic(db: Database) -> None:
     update_topic = {
         "update_id": 1,
         "message": {
@@ -25,14 +23,9 @@ def test_listener_ingests_message_and_topic() -> None:
             "forum_topic_created": {"name": "Build"},
         },
     }
-    ingest_update(db=db, config=config, update=update_topic)
+    ingest_update(db=db, config=_TEST_CONFIG, update=update_topic)
 
-    topic_row = db.conn.execute(
-        "SELECT title FROM topics WHERE chat_id = ? AND thread_id = ?;",
-        (-1001, 123),
-    ).fetchone()
-    assert topic_row is not None
-    assert topic_row["title"] == "Build"
+    assert db.get_topic_titles(chat_id=-1001, thread_ids=[123]) == {123: "Build"}
 
     update_message = {
         "update_id": 2,
@@ -45,7 +38,7 @@ def test_listener_ingests_message_and_topic() -> None:
             "text": "hello",
         },
     }
-    ingest_update(db=db, config=config, update=update_message)
+    ingest_update(db=db, config=_TEST_CONFIG, update=update_message)
 
     msg_row = db.conn.execute(
         "SELECT text, from_username FROM messages WHERE chat_id = ? AND message_id = ?;",
@@ -55,3 +48,76 @@ def test_listener_ingests_message_and_topic() -> None:
     assert msg_row["text"] == "hello"
     assert msg_row["from_username"] == "alice"
 
+
+
+def test_ingest_updates_writes_batch(db: Database) -> None:
+    updates = [
+        {
+            "update_id": 1,
+            "message": {
+                "message_id": 10,
+                "date": 1735689600,
+                "message_thread_id": 123,
+                "chat": {"id": -1001},
+                "forum_topic_created": {"name": "Build"},
+            },
+        },
+        {
+            "update_id": 2,
+            "message": {
+                "message_id": 11,
+                "date": 1735689660,
+                "message_thread_id": 123,
+                "chat": {"id": -1001},
+                "text": "hello",
+            },
+        },
+        {
+            "update_id": 3,
+            "message": {"message_id": 12, "date": 1735689720, "chat": {"id": -9999}, "text": "ignored"},
+        },
+    ]
+
+    assert ingest_updates(db=db, config=_TEST_CONFIG, updates=updates) == 2
+    assert db.get_message_count(chat_id=-1001) == 2
+    assert db.get_message_count(chat_id=-9999) == 0
+    assert db.get_topic_titles(chat_id=-1001, thread_ids=[123]) == {123: "Build"}
+    assert db.get_state("last_ingest_at_utc") is not None
+
+
+def test_listener_stores_compact_utf8_raw_json_as_text(db: Database) -> None:
+    update = {
+        "update_id": 3,
+        "message": {"message_id": 12, "date": 1735689600, "chat": {"id": -1001}, "text": "héllo"},
+    }
+    ingest_update(db=db, config=_TEST_CONFIG, update=update)
+
+    row = db.conn.execute(
+        "SELECT raw_json, typeof(raw_json) AS kind FROM messages WHERE message_id = 12;"
+    ).fetchone()
+    assert row["kind"] == "text"
+    assert row["raw_json"] == json.dumps(update, ensure_ascii=False, separators=(",", ":"))
+
+
+def test_listener_serializes_each_update_exactly_once(db: Database, monkeypatch) -> None:
+    calls = {"orjson.dumps": 0, "orjson.loads": 0, "json.dumps": 0, "json.loads": 0}
+
+    def _counting(name: str, real):
+        def _wrapped(*args: object, **kwargs: object):
+            calls[name] += 1
+            return real(*args, **kwargs)
+
+        return _wrapped
+
+    monkeypatch.setattr(orjson, "dumps", _counting("orjson.dumps", orjson.dumps))
+    monkeypatch.setattr(orjson, "loads", _counting("orjson.loads", orjson.loads))
+    monkeypatch.setattr(json, "dumps", _counting("json.dumps", json.dumps))
+    monkeypatch.setattr(json, "loads", _counting("json.loads", json.loads))
+
+    update = {
+        "update_id": 4,
+        "message": {"message_id": 13, "date": 1735689600, "chat": {"id": -1001}, "text": "once"},
+    }
+    ingest_update(db=db, config=_TEST_CONFIG, update=update)
+
+    assert calls == {"orjson.dumps": 1, "orjson.loads": 0, "json.dumps": 0, "json.loads": 0}
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from src.config import Config
+from src.db import Database
+from src.llm.interface import ChatMessage
+import src.rollups.refresh as refresh_module
+from src.rollups.refresh import maybe_refresh_rollups_before_digest
+from src.rollups.service import _format_messages, update_topic_rollup
+
+
+class _RecordingLLM:
+    def __init__(self) -> None:
+        self.calls: list[list[ChatMessage]] = []
+
+    def chat(self, *, messages: list[ChatMessage], **kwargs: object) -> str:
+        self.calls.append(messages)
+        return f"- summary {len(self.calls)}\n"
+
+
+def _seed(db: Database) -> None:
+    db.upsert_topic(chat_id=-1001, thread_id=5, title="Covenants", now_utc_iso="2025-01-01T00:00:00+00:00")
+    for message_id, text in ((10, "first idea"), (11, ""), (12, "second\nidea")):
+        db.upsert_message(
+            {
+                "chat_id": -1001,
+                "message_id": message_id,
+                "thread_id": 5,
+                "date_utc": f"2025-01-01T00:00:{message_id}+00:00",
+                "from_id": 1,
+                "from_username": "alice",
+                "from_display": None,
+                "text": text,
+                "raw_json": "{}",
+                "reply_to_message_id": None,
+                "is_service": 0,
+                "edit_date_utc": None,
+                "ingested_at_utc": "2025-01-01T00:00:00+00:00",
+            }
+        )
+
+
+def test_rollup_prompt_and_incremental_update(db: Database) -> None:
+    _seed(db)
+    config = Config(telegram_bot_token="t", source_chat_id=-1001, control_chat_ids=frozenset())
+    llm = _RecordingLLM()
+
+    first = update_topic_rollup(db=db, config=config, llm=llm, thread_id=5, mode="all")
+
+    assert first.updated
+    assert first.label == "Covenants"
+    assert first.last_message_id == 12
+    assert first.messages_used == 3
+    system, user = llm.calls[0]
+    assert system.role == "system"
+    assert "rolling topic summary" in system.content
+    assert user.content == (
+        "Topic: Covenants\n"
+        "Window: all time (recent tail)\n\n"
+        "Messages:\n"
+        "- [2025-01-01T00:00:10+00:00] alice: first idea\n"
+        "- [2025-01-01T00:00:12+00:00] alice: second idea"
+    )
+
+    again = update_topic_rollup(db=db, config=config, llm=llm, thread_id=5, mode=None)
+
+    assert not again.updated
+    assert again.summary == "- summary 1"
+    assert len(llm.calls) == 1
+
+    db.upsert_message(
+        {
+            "chat_id": -1001,
+            "message_id": 13,
+            "thread_id": 5,
+            "date_utc": "2025-01-01T00:00:13+00:00",
+            "from_id": 1,
+            "from_username": "alice",
+            "from_display": None,
+            "text": "third idea",
+            "raw_json": "{}",
+            "reply_to_message_id": None,
+            "is_service": 0,
+            "edit_date_utc": None,
+            "ingested_at_utc": "2025-01-01T00:00:00+00:00",
+        }
+    )
+    third = update_topic_rollup(db=db, config=config, llm=llm, thread_id=5, mode=None)
+
+    assert third.updated
+    assert third.last_message_id == 13
+    assert llm.calls[1][1].content == (
+        "Topic: Covenants\n"
+        "Window: since message_id 12\n\n"
+        "Previous summary:\n- summary 1\n\n"
+        "Messages:\n"
+        "- [2025-01-01T00:00:13+00:00] alice: third idea"
+    )
+
+
+def test_format_messages_tracks_max_id_including_blank_messages() -> None:
+    rows = [
+        {"message_id": 3, "date_utc": "d", "from_display": "Ann", "text": "hi"},
+        {"message_id": 9, "date_utc": "d", "from_display": "Ann", "text": "  "},
+        {"message_id": 4, "date_utc": "d", "from_display": None, "from_username": None, "text": "yo"},
+    ]
+
+    lines, max_id = _format_messages(rows)
+
+    assert lines == ["- [d] Ann: hi", "- [d] ?: yo"]
+    assert max_id == 9
+
+
+class _TopicLLM:
+    def chat(self, *, messages: list[ChatMessage], **kwargs: object) -> str:
+        first_line = messages[1].content.splitlines()[0]
+        if first_line == "Topic: Thread 7":
+            raise RuntimeError("boom")
+        return f"- {first_line}"
+
+
+def test_refresh_rollups_summarizes_topics_in_parallel(db: Database, monkeypatch) -> None:
+    _seed(db)
+    db.upsert_message(
+        {
+            "chat_id": -1001,
+            "message_id": 20,
+            "thread_id": 7,
+            "date_utc": "2025-01-01T00:01:00+00:00",
+            "from_id": 2,
+            "from_username": "bob",
+            "from_display": "Bob",
+            "text": "other topic",
+            "raw_json": "{}",
+            "reply_to_message_id": None,
+            "is_service": 0,
+            "edit_date_utc": None,
+            "ingested_at_utc": "2025-01-01T00:00:00+00:00",
+        }
+    )
+    config = Config(
+        telegram_bot_token="t",
+        source_chat_id=-1001,
+        control_chat_ids=frozenset(),
+        llm_provider="openrouter",
+        rollup_auto_refresh_before_digest=True,
+        rollup_refresh_concurrency=2,
+    )
+    monkeypatch.setattr(refresh_module, "create_llm_client", lambda config: _TopicLLM())
+    # The default 30-day rebuild window is relative to now; pin it to the seeded data.
+    monkeypatch.setattr(
+        "src.rollups.service.now_utc",
+        lambda: datetime(2025, 1, 2, tzinfo=timezone.utc),
+    )
+
+    maybe_refresh_rollups_before_digest(
+        db=db,
+        config=config,
+        window_start_utc="2025-01-01T00:00:00+00:00",
+        window_end_utc="2025-01-02T00:00:00+00:00",
+    )
+
+    rollups = db.get_topic_rollups(chat_id=-1001, thread_ids=[5, 7])
+    assert rollups[5].summary == "- Topic: Covenants"
+    assert rollups[5].last_message_id == 12
+    assert 7 not in rollups
+    assert db.get_state("last_rollup_refresh_at_utc") is not None
@@ -1,20 +1,10 @@
 from __future__ import annotations
 
 from src.commands.router import AskRequest, CommandContext, LatestRequest, RollupRequest, TextResponse, handle_command
-from src.config import Config
-from src.db import Database
 
 
-def _make_ctx() -> CommandContext:
-    db = Database(":memory:")
-    db.init_schema()
-    config = Config(telegram_bot_token="t", source_chat_id=-1001, control_chat_ids={123})
-    return CommandContext(config=config, db=db)
-
-
-def test_latest_parses_default() -> None:
-    ctx = _make_ctx()
-    result = handle_command(ctx=ctx, message={"text": "/latest"})
+def test_latest_parses_default(router_ctx: CommandContext) -> None:
+    result = handle_command(ctx=router_ctx, message={"text": "/latest"})
     assert isinstance(result, LatestRequest)
     assert result.duration is None
     assert result.mode == "brief"
@@ -22,9 +12,8 @@ def test_latest_parses_default() -> None:
     assert result.reset is False
 
 
-def test_latest_parses_flags_and_duration() -> None:
-    ctx = _make_ctx()
-    result = handle_command(ctx=ctx, message={"text": "/latest 6h full peek"})
+def test_latest_parses_flags_and_duration(router_ctx: CommandContext) -> None:
+    result = handle_command(ctx=router_ctx, message={"text": "/latest 6h full peek"})
     assert isinstance(result, LatestRequest)
     assert result.duration is not None
     assert int(result.duration.total_seconds()) == 6 * 3600
@@ -32,25 +21,21 @@ def test_latest_parses_flags_and_duration() -> None:
     assert result.advance_state is False
 
 
-def test_latest_free_text_shortcut() -> None:
-    ctx = _make_ctx()
-    result = handle_command(ctx=ctx, message={"text": "Give me the latest"})
+def test_latest_free_text_shortcut(router_ctx: CommandContext) -> None:
+    result = handle_command(ctx=router_ctx, message={"text": "Give me the latest"})
     assert isinstance(result, LatestRequest)
 
 
-def test_ask_returns_request() -> None:
-    ctx = _make_ctx()
-    result = handle_command(ctx=ctx, message={"text": "/ask 6h what's going on?"})
+def test_ask_returns_request(router_ctx: CommandContext) -> None:
+    result = handle_command(ctx=router_ctx, message={"text": "/ask 6h what's going on?"})
     assert isinstance(result, AskRequest)
 
 
-def test_ask_requires_args() -> None:
-    ctx = _make_ctx()
-    result = handle_command(ctx=ctx, message={"text": "/ask"})
+def test_ask_requires_args(router_ctx: CommandContext) -> None:
+    result = handle_command(ctx=router_ctx, message={"text": "/ask"})
     assert isinstance(result, TextResponse)
 
 
-def test_rollup_returns_request() -> None:
-    ctx = _make_ctx()
-    result = handle_command(ctx=ctx, message={"text": "/rollup 123 rebuild"})
+def test_rollup_returns_request(router_ctx: CommandContext) -> None:
+    result = handle_command(ctx=router_ctx, message={"text": "/rollup 123 rebuild"})
     assert isinstance(result, RollupRequest)
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+import pytest
+
+from src.telegram_client import TelegramClient
+
+
+class _FakeResponse:
+    def __init__(self, payload: dict[str, Any], status_code: int = 200) -> None:
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.content = json.dumps(payload).encode("utf-8")
+        self._payload = payload
+
+    def json(self) -> dict[str, Any]:
+        return self._payload
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class _FakeSession:
+    def __init__(self) -> None:
+        self.gets: list[tuple[str, dict[str, Any]]] = []
+        self.posts: list[tuple[str, dict[str, Any]]] = []
+
+    def get(self, url: str, *, params: dict[str, Any], timeout: int) -> _FakeResponse:
+        self.gets.append((url, params))
+        return _FakeResponse({"ok": True, "result": [{"update_id": 1, "message": {"text": "é"}}]})
+
+    def post(self, url: str, *, data: dict[str, Any], timeout: int) -> _FakeResponse:
+        self.posts.append((url, data))
+        return _FakeResponse({"ok": True, "result": {"message_id": 100 + len(self.posts)}})
+
+
+def test_send_message_sends_chunks_in_order_with_markup_on_first() -> None:
+    session = _FakeSession()
+    client = TelegramClient(token="abc", session=session)
+    text = "\n".join(f"line {i} " + "x" * 90 for i in range(100))
+
+    res = client.send_message(
+        chat_id=-1001,
+        text=text,
+        message_thread_id=7,
+        reply_markup={"inline_keyboard": []},
+    )
+
+    assert len(session.posts) > 1
+    assert res.message_ids == [101 + i for i in range(len(session.posts))]
+    assert all(url == "https://api.telegram.org/botabc/sendMessage" for url, _ in session.posts)
+    assert "".join(data["text"] for _, data in session.posts).replace("\n", "") == text.replace("\n", "")
+    assert session.posts[0][1]["reply_markup"] == '{"inline_keyboard": []}'
+    assert all("reply_markup" not in data for _, data in session.posts[1:])
+    assert all(data["message_thread_id"] == 7 for _, data in session.posts)
+
+
+def test_get_updates_accepts_list_or_pre_encoded_allowed_updates() -> None:
+    session = _FakeSession()
+    client = TelegramClient(token="abc", session=session)
+
+    for allowed in (["message", "callback_query"], '["message","callback_query"]'):
+        updates = client.get_updates(offset=5, timeout_seconds=1, allowed_updates=allowed)
+        assert updates == [{"update_id": 1, "message": {"text": "é"}}]
+
+    assert session.gets[0][0] == "https://api.telegram.org/botabc/getUpdates"
+    assert [json.loads(params["allowed_updates"]) for _, params in session.gets] == [
+        ["message", "callback_query"],
+        ["message", "callback_query"],
+    ]
+    assert session.gets[0][1]["offset"] == 5
+
+
+def test_send_message_surfaces_telegram_error_description() -> None:
+    session = _FakeSession()
+    session.post = lambda url, *, data, timeout: _FakeResponse(  # type: ignore[method-assign]
+        {"ok": False, "description": "Bad Request: chat not found"}, status_code=400
+    )
+    client = TelegramClient(token="abc", session=session)
+
+    with pytest.raises(RuntimeError, match="HTTP 400, 'Bad Request: chat not found'"):
+        client.send_message(chat_id=1, text="hi")
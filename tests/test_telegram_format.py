@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from src.util.telegram_format import chunk_text
+
+
+def test_chunk_text_short_text_is_single_chunk() -> None:
+    assert chunk_text("hello", limit=10) == ["hello"]
+
+
+def test_chunk_text_prefers_topic_boundaries() -> None:
+    text = "Intro line\n\nTopic: A\n- a1\n- a2\n\nTopic: B\n- b1"
+    chunks = chunk_text(text, limit=40)
+    assert chunks == ["Intro line\n\nTopic: A\n- a1\n- a2", "Topic: B\n- b1"]
+
+
+def test_chunk_text_keeps_headers_with_their_content() -> None:
+    text = "Summary\n- one\n- two\nQuotes:\n- q1\n- q2"
+    chunks = chunk_text(text, limit=28)
+    assert chunks == ["Summary\n- one\n- two", "Quotes:\n- q1\n- q2"]
+    assert all(len(c) <= 28 for c in chunks)
+
+
+def test_chunk_text_hard_cuts_long_lines() -> None:
+    assert chunk_text("x" * 25, limit=10) == ["x" * 10, "x" * 10, "x" * 5]
+
+
+def test_chunk_text_orphan_header_cut_with_crlf_lines() -> None:
+    text = "a\r\nb\r\nc\r\nQuotes:\n- q1 is long"
+    assert chunk_text(text, limit=20) == ["a\r\nb\r\nc", "Quotes:\n- q1 is long"]
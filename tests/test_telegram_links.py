@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from src.util.telegram_links import build_message_link
+from src.util.telegram_links import build_message_link, build_message_link_prefix
 
 
 def test_build_message_link_public_no_thread() -> None:
@@ -23,3 +23,11 @@ def test_build_message_link_private_fallback_with_thread() -> None:
         == "https://t.me/c/2471422883/72/73"
     )
 
+
+
+def test_build_message_link_prefix_matches_full_link() -> None:
+    prefix = build_message_link_prefix(chat_id=-1002471422883, thread_id=72, username=None)
+    assert prefix == "https://t.me/c/2471422883/72/"
+    assert f"{prefix}73" == build_message_link(
+        chat_id=-1002471422883, message_id=73, thread_id=72, username=None
+    )
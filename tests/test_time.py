@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.util.time import parse_duration, to_iso_utc, unix_to_iso_utc
+
+
+def test_unix_to_iso_utc_matches_datetime_formatting() -> None:
+    for ts in (0, 1735689600, 1735689661, 951782400, -1):
+        assert unix_to_iso_utc(ts) == to_iso_utc(datetime.fromtimestamp(ts, tz=timezone.utc))
+    assert unix_to_iso_utc(1735689600) == "2025-01-01T00:00:00+00:00"
+
+
+def test_parse_duration_units_and_errors() -> None:
+    assert parse_duration("45s") == timedelta(seconds=45)
+    assert parse_duration("30m") == timedelta(minutes=30)
+    assert parse_duration(" 6H ") == timedelta(hours=6)
+    assert parse_duration("2d") == timedelta(days=2)
+    assert parse_duration("1w") == timedelta(weeks=1)
+    for bad in ("", "6", "h", "-1h", "1y", "1.5h"):
+        with pytest.raises(ValueError):
+            parse_duration(bad)